@@ -1,21 +1,21 @@
 __version__ = "0.1"
 # Importing Libraries
+# requests, pymysql, yaml and dotenv are imported where they are used, so importing this
+# module (from a process pool, the recommender or a REPL) stays cheap and side-effect free.
 import sys
 import os
 import re
-import requests
+import math
 import json
 import time
 import traceback
 from random import shuffle
-import pymysql
 import datetime as dt
 import logging
 import argparse
 import shutil
 from copy import deepcopy
-import yaml
-from dotenv import load_dotenv
+from itertools import groupby, islice
 from typing import Dict, Any, Optional, List
 
 CONFIG_FILE = 'config.yaml'
@@ -24,6 +24,7 @@ CONFIG = {}
 ENDPOINTS = {}
 # Loading Config File
 def load_config_file():
+    import yaml
     try:
 
         with open(CONFIG_FILE, 'r', encoding='utf-8') as f:
@@ -38,6 +39,7 @@ def load_config_file():
 
 # Loading EndPoint File
 def load_endpoints_file():
+    import yaml
     try:
         with open(ENDPOINT_FILE, 'r', encoding='utf-8') as f:
             global ENDPOINTS
@@ -49,7 +51,6 @@ def load_endpoints_file():
         logging.error(f"Error parsing {ENDPOINT_FILE}: {e}")
         raise
 
-load_dotenv()
 APPLIST_CACHE_FILE = 'applist.json'
 # All about Logging
 def manage_log_files():
@@ -63,16 +64,18 @@ def manage_log_files():
             logging.info(f"Archived old log files: {filename}")
     return f"scraper_log_{dt.datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}.log"
 
-log_filename = manage_log_files()
-logging.basicConfig(
-    level=logging.INFO,
-    format='[%(levelname).1s %(asctime)s] %(message)s',
-    datefmt='%H:%M:%S',
-    handlers=[
-        logging.FileHandler(log_filename),      # Sends log messages to the file.
-        logging.StreamHandler(sys.stdout)       # Sends log messages to the console.
-    ]
-)
+def setup_logging():
+    """Archives old log files and configures the root logger; only called from `main`."""
+    log_filename = manage_log_files()
+    logging.basicConfig(
+        level=logging.INFO,
+        format='[%(levelname).1s %(asctime)s] %(message)s',
+        datefmt='%H:%M:%S',
+        handlers=[
+            logging.FileHandler(log_filename),      # Sends log messages to the file.
+            logging.StreamHandler(sys.stdout)       # Sends log messages to the console.
+        ]
+    )
 
 class SteamAPI:
     """
@@ -81,11 +84,13 @@ class SteamAPI:
     def __init__(self, steam_api_config: dict, scraper_settings: dict) -> None:
         self.config = steam_api_config
         self.settings = scraper_settings
+        import requests
         self.session = requests.Session()
         self.session.headers.update({'User-Agent': f'SteamScraper/{__version__}'})
         logging.info("SteamAPI initialized")
 
     def _do_requests(self, url: str, params: Optional[dict] = None) -> dict:
+        import requests
         try:
             response = self.session.get(url, params = params, timeout = self.settings['timeout'])
             response.raise_for_status()
@@ -194,25 +199,105 @@ class SteamAPI:
 #             "completionist": round(ttb.get('completely', 0) / 3600, 2) if ttb.get('completely') else None
 #         }
 
+class BulkStager:
+    """
+    Writes rows for the staging tables as TSV files in LOAD DATA's default format
+    (tab separated, backslash escaped, \\N for NULL).
+    """
+    def __init__(self, staging_dir: str, tables: List[str]):
+        self.staging_dir = staging_dir
+        self.tables = tables
+        os.makedirs(staging_dir, exist_ok=True)
+        # Files left by a run whose merge failed are appended to, never truncated.
+        self.open(resume=True)
+
+    def open(self, resume: bool = False):
+        """Starts the next batch of staged files; with `resume`, rows already in them are kept and counted."""
+        self.staged_apps = 0
+        self.staged_rows = 0
+        if resume:
+            for table in self.tables:
+                rows = self._recover(self.path(table))
+                self.staged_rows += rows
+                if table == 'stg_apps':
+                    self.staged_apps = rows
+        mode = 'a' if resume else 'w'
+        self.files = {t: open(self.path(t), mode, encoding='utf-8', newline='') for t in self.tables}
+
+    @staticmethod
+    def _recover(path: str) -> int:
+        """Counts the complete rows in a staged file, dropping a last line cut off by a crash."""
+        if not os.path.exists(path):
+            return 0
+        with open(path, 'rb+') as f:
+            data = f.read()
+            complete = data.rfind(b'\n') + 1
+            if complete < len(data):
+                f.truncate(complete)
+        return data.count(b'\n')
+
+    def close(self):
+        for f in self.files.values():
+            f.close()
+
+    def path(self, table: str) -> str:
+        return os.path.abspath(os.path.join(self.staging_dir, f"{table}.tsv"))
+
+    def write(self, table: str, row: tuple):
+        self.files[table].write('\t'.join(self._to_field(v) for v in row) + '\n')
+        self.staged_rows += 1
+
+    @staticmethod
+    def _to_field(value) -> str:
+        if value is None: return '\\N'
+        if isinstance(value, bool): return '1' if value else '0'
+        if isinstance(value, dt.datetime): return value.strftime('%Y-%m-%d %H:%M:%S')
+        return (str(value).replace('\\', '\\\\').replace('\t', '\\t')
+            .replace('\n', '\\n').replace('\r', '\\r'))
+
+    @staticmethod
+    def read_rows(path: str):
+        """Parses a staged file back into tuples, for servers that refuse LOAD DATA LOCAL INFILE."""
+        escapes = {'t': '\t', 'n': '\n', 'r': '\r'}
+        with open(path, 'r', encoding='utf-8', newline='') as f:
+            for line in f:
+                yield tuple(None if field == '\\N' else re.sub(r'\\(.)', lambda m: escapes.get(m.group(1), m.group(1)), field)
+                    for field in line.rstrip('\n').split('\t'))
+
 class DatabaseManager:
     """
     Creates all data
     """
-    def __init__(self, db_creds: dict, schema_yaml_path: str = "schema.yaml"):
+    # Server or client has local_infile disabled.
+    LOCAL_INFILE_DISABLED = (1148, 3948)
+
+    def __init__(self, db_creds: dict, schema_yaml_path: str = "schema.yaml",
+            staging_dir: Optional[str] = None, flush_every: int = 5000):
+        import pymysql
         self.schema = self._load_schema(schema_yaml_path)
-        load_dotenv()
+        self.flush_every = flush_every
+        self.bulk = None
         try:
             self.connection = pymysql.connect(
                 host=db_creds['host'], user=db_creds['user'], password=db_creds['password'],
-                database=db_creds['database'], cursorclass=pymysql.cursors.DictCursor, charset='utf8mb4'
+                database=db_creds['database'], cursorclass=pymysql.cursors.DictCursor, charset='utf8mb4',
+                local_infile=staging_dir is not None
             )
             self.cursor = self.connection.cursor()
             self._creates_tables()
+            if staging_dir:
+                self._create_staging_tables()
+                self.bulk = BulkStager(staging_dir, self.schema['staging']['create_order'])
+                logging.info(f"Bulk mode: staging rows in {staging_dir}, merging every {flush_every} apps")
+                if self.bulk.staged_rows:
+                    logging.warning(f"Merging {self.bulk.staged_rows} rows an earlier run left in {staging_dir}")
+                    self.flush_bulk()
         except pymysql.Error as e:
             logging.error(f"Database connection failed: {e}")
             sys.exit(1)
 
     def _load_schema(self, schema_yaml_path: str) -> dict:
+        import yaml
         if schema_yaml_path:
             try:
                 with open(schema_yaml_path, 'r') as file:
@@ -240,6 +325,7 @@ class DatabaseManager:
         Drops all application tables from the database in the correct order.
         This is a destructive operation and should be used with caution.
         """
+        import pymysql
         try:
             self.cursor.execute("SET FOREIGN_KEY_CHECKS = 0;")
             logging.warning("Attempting to drop all scraper tables...")
@@ -255,6 +341,7 @@ class DatabaseManager:
             self.connection.commit()
 
     def _creates_tables(self):
+        import pymysql
         for table_name in self.schema['create_order']:
             try:
                 self.cursor.execute(self.schema['tables'][table_name])
@@ -267,6 +354,7 @@ class DatabaseManager:
         self.connection.commit()
 
     def is_processed(self, app_id: int) -> bool:
+        import pymysql
         try:
             self.cursor.execute(self.schema['queries']['scrape_status']['is_processed'], (app_id, ))
             return self.cursor.fetchone() is not None
@@ -283,6 +371,10 @@ class DatabaseManager:
         return result['count'] if result else 0
 
     def mark_as_processed(self, appid: int, status: str):
+        if self.bulk:
+            self.bulk.write('stg_scrape_status', (appid, status))
+            self.bulk.staged_apps += 1
+            return
         self.cursor.execute(self.schema['queries']['scrape_status']['mark_processed'], (appid, status))
 
     def _get_or_create_id(self, table: str, name: str) -> int:
@@ -295,6 +387,9 @@ class DatabaseManager:
 
     def add_pending_dlc_link(self, dlc_id: int, base_game_id: int):
         logging.info(f"Adding pending DLC link for DLC ID {dlc_id} and base game ID {base_game_id}")
+        if self.bulk:
+            self.bulk.write('stg_pending_dlc_links', (dlc_id, base_game_id))
+            return
         sql = self.schema['queries']['junction_tables']['add_pending_dlc']
         self.cursor.execute(sql, (dlc_id, base_game_id))
 
@@ -316,6 +411,9 @@ class DatabaseManager:
 
     def add_app_and_relations(self, parsed_data: Dict[str, Any]):
         """Inserts/updates an app in the master `apps` table, then links all its related data."""
+        if self.bulk:
+            self._stage_app(parsed_data)
+            return
         # --- THIS IS THE CRUCIAL FIX ---
         # We now pass the 'main_tuple' to the execute command, which matches the '%s' placeholders.
         self.cursor.execute(self.schema['queries']['apps']['insert_update'], parsed_data['main_tuple'])
@@ -332,7 +430,7 @@ class DatabaseManager:
 
         sql_link_lang = self.schema['queries']['junction_tables']['insert_language']
         for lang_name in parsed_data.get('supported_languages', []):
-            is_audio = lang_name in parsed_data['main_dict'].get('full_audio_languages', [])
+            is_audio = lang_name in parsed_data.get('full_audio_languages', [])
             lang_id = self._get_or_create_id('languages', lang_name)
             if lang_id != -1: self.cursor.execute(sql_link_lang, (app_id, lang_id, is_audio))
 
@@ -343,11 +441,45 @@ class DatabaseManager:
             tag_id = self._get_or_create_id('tags', tag_name)
             if tag_id != -1: self.cursor.execute(sql_link_tag, (app_id, tag_id, tag_value))
 
+        # Built from the junction tables, like the bulk merge and --backfill-features, so every mode agrees.
+        self.cursor.execute(self.schema['queries']['app_features']['backfill'].format(filter='WHERE a.id = %s'),
+            (self._next_feature_version(), app_id))
+
+    def _stage_app(self, parsed_data: Dict[str, Any]):
+        app_id = parsed_data['main_tuple'][0]
+        self.bulk.write('stg_apps', parsed_data['main_tuple'])
+        for item_type in ['developers', 'publishers', 'categories', 'genres']:
+            for name in parsed_data.get(item_type, []):
+                self.bulk.write('stg_app_relations', (app_id, item_type, name, None, None))
+        for lang_name in parsed_data.get('supported_languages', []):
+            is_audio = lang_name in parsed_data.get('full_audio_languages', [])
+            self.bulk.write('stg_app_relations', (app_id, 'languages', lang_name, None, is_audio))
+        tags = parsed_data.get('tags', {})
+        for tag_name, tag_value in ({} if isinstance(tags, list) else tags).items():
+            self.bulk.write('stg_app_relations', (app_id, 'tags', tag_name, tag_value, None))
+
+    def _next_feature_version(self) -> int:
+        """Takes the next app_features change version; the counter row stays locked until commit."""
+        self.cursor.execute(self.schema['queries']['app_features']['next_version'])
+        self.cursor.execute(self.schema['queries']['app_features']['current_version'])
+        return self.cursor.fetchone()['version']
+
+    def backfill_app_features(self):
+        """Builds app_features for every app already in the database, under a single change version."""
+        logging.info("Backfilling app_features from the junction tables...")
+        version = self._next_feature_version()
+        self.cursor.execute(self.schema['queries']['app_features']['backfill'].format(filter=''), (version, ))
+        self.connection.commit()
+        logging.info(f"Backfilled app_features at version {version}")
+
     def add_achievements(self, achievements: list):
         if not achievements: return
         sql = self.schema['queries']['achievements']['insert_update']
         data = [(a['app_id'], a['api_name'], a['display_name'],
             a['description'], a['global_completion_rate']) for a in achievements]
+        if self.bulk:
+            for row in data: self.bulk.write('stg_achievements', row)
+            return
         self.cursor.executemany(sql, data)
 
     def add_reviews(self, reviews: list, app_id: str):
@@ -363,30 +495,226 @@ class DatabaseManager:
                 r.get('votes_up'), r.get('votes_funny'), dt.datetime.fromtimestamp(r.get('timestamp_created'))
             ))
             link_tuples.append((app_id, r['recommendationid']))
+        if self.bulk:
+            for t in review_tuples: self.bulk.write('stg_reviews', (app_id, *t))
+            return
+        # Must run before the upsert so it can see what the re-inserted reviews used to count as.
+        self._update_review_stats(int(app_id), review_tuples)
         if review_tuples:
             self.cursor.executemany(sql_insert_review, review_tuples)
         if link_tuples:
             self.cursor.executemany(sql_link_review, link_tuples)
 
+    def _update_review_stats(self, app_id: int, review_tuples: list):
+        """
+        Applies a batch of review upserts to the app's `app_review_stats` row as a delta.
+        Reviews that already count towards the app are subtracted with their stored values
+        first, so re-inserting the same review IDs never double counts. Apps without a row
+        (scraped before the table existed) start from their already linked reviews.
+        """
+        queries = self.schema['queries']['review_stats']
+        incoming = {int(t[0]): t for t in review_tuples}  # last occurrence wins, like the upsert
+        placeholders = ', '.join(['%s'] * len(incoming))
+        self.cursor.execute(queries['select_existing_reviews'].format(placeholders=placeholders),
+            (app_id, *incoming.keys()))
+        existing = {int(row['review_id']): row for row in self.cursor.fetchall()}
+        self.cursor.execute(queries['select_for_update'], (app_id, ))
+        row = self.cursor.fetchone()
+        if row is None:
+            self.cursor.execute(queries['select_app_reviews'], (app_id, ))
+            stats = self._review_stats_from_reviews(self.cursor.fetchall())
+        else:
+            stats = self._review_stats_from_row(row)
+
+        for review_id, t in incoming.items():
+            old = existing.get(review_id)
+            if old and old['linked']:
+                self._add_review_to_stats(stats, old['language'], old['review_date'],
+                    old['is_recommended'], old['votes_helpful'], sign=-1)
+            # The upsert keeps the stored language and date of reviews that already exist.
+            language, review_date = (old['language'], old['review_date']) if old else (t[2], t[7])
+            self._add_review_to_stats(stats, language, review_date, t[4], t[5], sign=1)
+        self._save_review_stats(app_id, stats)
+
+    def rebuild_review_stats(self, app_id: int):
+        """Recomputes one app's review aggregate from scratch."""
+        self.cursor.execute(self.schema['queries']['review_stats']['select_app_reviews'], (app_id, ))
+        self._save_review_stats(app_id, self._review_stats_from_reviews(self.cursor.fetchall()))
+
+    def _review_stats_from_reviews(self, rows) -> dict:
+        stats = self._review_stats_from_row(None)
+        for row in rows:
+            self._add_review_to_stats(stats, row['language'], row['review_date'],
+                row['is_recommended'], row['votes_helpful'], sign=1)
+        return stats
+
+    def get_review_stats(self, app_id: int) -> Optional[dict]:
+        self.cursor.execute(self.schema['queries']['review_stats']['select'], (app_id, ))
+        row = self.cursor.fetchone()
+        if not row:
+            return None
+        row['language_counts'] = json.loads(row['language_counts'] or '{}')
+        row['monthly_histogram'] = json.loads(row['monthly_histogram'] or '{}')
+        return row
+
+    @staticmethod
+    def _review_stats_from_row(row: Optional[dict]) -> dict:
+        row = row or {}
+        return {
+            'review_count': row.get('review_count', 0), 'recommended_count': row.get('recommended_count', 0),
+            'helpful_weight_total': float(row.get('helpful_weight_total', 0.0)),
+            'helpful_weight_recommended': float(row.get('helpful_weight_recommended', 0.0)),
+            'language_counts': json.loads(row.get('language_counts') or '{}'),
+            'monthly_histogram': json.loads(row.get('monthly_histogram') or '{}'),
+        }
+
+    @staticmethod
+    def _add_review_to_stats(stats: dict, language: Optional[str], review_date, is_recommended,
+            votes_helpful, sign: int):
+        recommended = 1 if is_recommended else 0
+        # Helpful votes raise a review's weight, but logarithmically so one viral review can't dominate.
+        weight = 1.0 + math.log1p(max(int(votes_helpful or 0), 0))
+        stats['review_count'] += sign
+        stats['recommended_count'] += sign * recommended
+        stats['helpful_weight_total'] += sign * weight
+        stats['helpful_weight_recommended'] += sign * weight * recommended
+
+        language = language or 'unknown'
+        languages = stats['language_counts']
+        languages[language] = languages.get(language, 0) + sign
+        if languages[language] <= 0: del languages[language]
+
+        if review_date:
+            bucket = review_date.strftime('%Y-%m')
+            histogram = stats['monthly_histogram']
+            count, positive = histogram.get(bucket, [0, 0])
+            histogram[bucket] = [count + sign, positive + sign * recommended]
+            if histogram[bucket][0] <= 0: del histogram[bucket]
+
+    def _save_review_stats(self, app_id: int, stats: dict):
+        count, weight_total = stats['review_count'], stats['helpful_weight_total']
+        self.cursor.execute(self.schema['queries']['review_stats']['upsert'], (
+            app_id, count, stats['recommended_count'],
+            round(stats['recommended_count'] / count, 5) if count > 0 else None,
+            weight_total, stats['helpful_weight_recommended'],
+            round(stats['helpful_weight_recommended'] / weight_total, 5) if weight_total > 0 else None,
+            json.dumps(stats['language_counts']), json.dumps(dict(sorted(stats['monthly_histogram'].items())))
+        ))
+
     def update_time_to_beat(self, appid: int, time_data: dict):
         sql = self.schema['queries']['apps']['update_time_to_beat']
         self.cursor.execute(sql, (time_data.get('main'), time_data.get('extras'), time_data.get('completionist'), appid))
 
+    def _create_staging_tables(self):
+        for table_name in self.schema['staging']['create_order']:
+            self.cursor.execute(self.schema['staging']['tables'][table_name])
+        self.connection.commit()
+
+    def _load_staging_file(self, table: str):
+        import pymysql
+        queries = self.schema['staging']['queries']
+        path = self.bulk.path(table)
+        try:
+            self.cursor.execute(queries['load'].format(table=table), (path, ))
+        except pymysql.err.OperationalError as e:
+            if e.args[0] not in self.LOCAL_INFILE_DISABLED:
+                raise
+            logging.warning(f"LOAD DATA LOCAL INFILE is disabled, inserting {table} in batches instead")
+            rows = BulkStager.read_rows(path)
+            while batch := list(islice(rows, 1000)):
+                placeholders = ', '.join(['%s'] * len(batch[0]))
+                self.cursor.executemany(queries['insert'].format(table=table, placeholders=placeholders), batch)
+
+    def flush_bulk(self):
+        """Loads the staged files into the staging tables and merges them into the live tables."""
+        import pymysql
+        if not self.bulk or self.bulk.staged_rows == 0:
+            return
+        self.bulk.close()
+        staging, queries = self.schema['staging'], self.schema['staging']['queries']
+        start = time.time()
+        try:
+            # TRUNCATE commits implicitly, so it runs first; everything after is one transaction.
+            for table in staging['create_order']:
+                self.cursor.execute(queries['truncate'].format(table=table))
+            for table in staging['create_order']:
+                self._load_staging_file(table)
+
+            self.cursor.execute(queries['merge_apps'])
+            self.cursor.execute(queries['merge_pending_dlc_links'])
+            self.cursor.execute(self.schema['queries']['utility_queries']['resolve_dlc_links'])
+            self.cursor.execute(self.schema['queries']['utility_queries']['clear_resolved_dlc_links'])
+            for item_type in ['developers', 'publishers', 'categories', 'genres', 'languages', 'tags']:
+                self.cursor.execute(queries['merge_lookup'].format(table=item_type), (item_type, ))
+            for item_type in ['developers', 'publishers', 'categories', 'genres']:
+                self.cursor.execute(queries['merge_junction'].format(table=item_type), (item_type, ))
+            self.cursor.execute(queries['merge_languages'])
+            self.cursor.execute(queries['merge_tags'])
+            self.cursor.execute(self.schema['queries']['app_features']['backfill'].format(
+                filter='WHERE a.id IN (SELECT id FROM stg_apps)'), (self._next_feature_version(), ))
+            self.cursor.execute(queries['merge_achievements'])
+            self.cursor.execute(queries['merge_reviews'])
+            self.cursor.execute(queries['merge_app_reviews'])
+            self._rebuild_staged_review_stats()
+            self.cursor.execute(queries['merge_scrape_status'])
+            self.connection.commit()
+            logging.info(f"Bulk merged {self.bulk.staged_apps} apps ({self.bulk.staged_rows} rows) in {time.time() - start:.1f}s")
+        except pymysql.Error as e:
+            self.connection.rollback()
+            logging.error(f"Bulk merge failed, staged files kept in {self.bulk.staging_dir}: {e}")
+            raise
+        self.bulk.open()
+
+    def _rebuild_staged_review_stats(self):
+        """Recomputes app_review_stats for every app that had reviews staged, in one streamed scan."""
+        self._rebuild_review_stats_from(self.schema['staging']['queries']['select_staged_app_reviews'])
+
+    def backfill_review_stats(self):
+        """Rebuilds app_review_stats for every app with linked reviews, e.g. for apps scraped before it existed."""
+        logging.info("Backfilling app_review_stats from the linked reviews...")
+        count = self._rebuild_review_stats_from(self.schema['queries']['review_stats']['select_all_app_reviews'])
+        self.connection.commit()
+        logging.info(f"Backfilled app_review_stats for {count} apps")
+
+    def _rebuild_review_stats_from(self, sql: str) -> int:
+        """Streams (app_id, review) rows ordered by app_id and saves one rebuilt aggregate per app."""
+        import pymysql
+        cursor = self.connection.cursor(pymysql.cursors.SSDictCursor)
+        stats_rows = []
+        try:
+            cursor.execute(sql)
+            for app_id, rows in groupby(cursor, key=lambda row: row['app_id']):
+                stats_rows.append((app_id, self._review_stats_from_reviews(rows)))
+        finally:
+            cursor.close()
+        for app_id, stats in stats_rows:
+            self._save_review_stats(app_id, stats)
+        return len(stats_rows)
+
     def commit(self):
+        if self.bulk:
+            if self.bulk.staged_apps >= self.flush_every:
+                self.flush_bulk()
+            return
         self.connection.commit()
 
     def close(self):
         if self.connection and self.connection.open:
+            if self.bulk:
+                self.flush_bulk()
+                self.bulk.close()
             self.connection.commit()
             self.cursor.close()
             self.connection.close()
             logging.info("Database connection closed")
 
 class SteamScraperApplication:
-    def __init__(self):
-        self.args = self._setup_arg_parser()
+    def __init__(self, argv: Optional[List[str]] = None):
+        self.args = self._setup_arg_parser(argv)
         db_creds, steam_api_key = self._load_and_validate_credentials()
-        self.db = DatabaseManager(db_creds)
+        settings = CONFIG['scraper_settings']
+        staging_dir = settings['staging_dir'] if self.args.bulk else None
+        self.db = DatabaseManager(db_creds, staging_dir=staging_dir, flush_every=settings['bulk_flush_every'])
         self.steam_api = SteamAPI(CONFIG['steam_api'], CONFIG['scraper_settings'])
 
         # self.igdb_api = IGDB_API(CONFIG['scraper_settings'])
@@ -488,14 +816,20 @@ class SteamScraperApplication:
             print("\n"); logging.info(f"Scrape session concluded. Processed {newly_processed_count} new apps.")
             self.db.close()
 
-    def _setup_arg_parser(self) -> argparse.Namespace:
+    def _setup_arg_parser(self, argv: Optional[List[str]] = None) -> argparse.Namespace:
         parser = argparse.ArgumentParser(description=f'Steam Scraper {__version__}',
             formatter_class=argparse.RawTextHelpFormatter)
         parser.add_argument('--drop-tables', action='store_true',
             help='Drop all scraper tables from the database and exit.')
         parser.add_argument('--pre-filter', action='store_true',
             help='Pre-filter which are already processed')
-        return parser.parse_args()
+        parser.add_argument('--bulk', action='store_true',
+            help='Stage rows as TSV files and merge them with LOAD DATA in batches (for large backfills).')
+        parser.add_argument('--backfill-features', action='store_true',
+            help='Rebuild the app_features table from already scraped apps and exit.')
+        parser.add_argument('--backfill-review-stats', action='store_true',
+            help='Rebuild the app_review_stats table from already scraped reviews and exit.')
+        return parser.parse_args(argv)
 
     def _parse_app_data(self, app_details: dict, spy_details: Optional[dict]) -> dict:
         appid = app_details['steam_appid']
@@ -606,10 +940,14 @@ class SteamScraperApplication:
         except (ValueError, AttributeError):
             return 0.0
 
-if __name__ == '__main__':
+def main(argv: Optional[List[str]] = None) -> int:
+    """CLI entry point: all logging, .env and config setup happens here rather than at import."""
+    from dotenv import load_dotenv
+    setup_logging()
+    load_dotenv()
     load_endpoints_file()
     load_config_file()
-    scraper = SteamScraperApplication()
+    scraper = SteamScraperApplication(argv)
 
     if scraper.args.drop_tables:
         confirm = input("Are you sure you want to drop all scraper tables? This cannot be undone. (yes/no): ")
@@ -617,5 +955,16 @@ if __name__ == '__main__':
             scraper.db._drop_all_tables()
         else:
             print("Operation cancelled.")
+    if scraper.args.backfill_features or scraper.args.backfill_review_stats:
+        if scraper.args.backfill_features:
+            scraper.db.backfill_app_features()
+        if scraper.args.backfill_review_stats:
+            scraper.db.backfill_review_stats()
+        scraper.db.close()
+        return 0
     scraper.run()
     logging.info("Done")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
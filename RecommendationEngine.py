@@ -1,7 +1,912 @@
+import os
+import re
+import sys
+import json
+import hashlib
+import logging
+import argparse
+from collections import deque
+from itertools import islice
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Any, Optional, List, Iterable, Iterator, Tuple
+
+import numpy as np
+import yaml
+
+CONFIG_FILE = 'config.yaml'
+SCHEMA_FILE = 'schema.yaml'
+
+# Text columns that make up an app's description, in the order they are joined.
+TEXT_FIELDS = ('name', 'short_description', 'about_the_game', 'detailed_description')
+# Structured columns are emitted as prefixed tokens ("tag:42") so they never collide
+# with description words and can be mapped back to the lookup tables by id.
+STRUCTURED_FIELDS = {'genre': 'genre_ids', 'category': 'category_ids', 'tag': 'tag_ids'}
+_TOKEN_PATTERN = re.compile(r"(?u)\b\w\w+\b")
+# A series name ends at its subtitle ("Dark Souls III: ...", "Portal 2 - ...") and sheds sequel numbers.
+_SUBTITLE_PATTERN = re.compile(r"\s*(?::|\s[-\u2013\u2014]\s|\()")
+_SEQUEL_PATTERN = re.compile(r"(?:\s+(?:\d+|[ivx]+))+$")
+_KIND_PLURALS = {'tag': 'tags', 'genre': 'genres', 'category': 'categories'}
+# Everything str.splitlines() breaks on; names.txt holds one name per line, so none may survive in a name.
+_LINE_BREAKS = re.compile(r"[\n\r\x0b\x0c\x1c-\x1e\x85\u2028\u2029]")
+
+
+def _split_ids(value) -> List[str]:
+    """Accepts a JSON array string ("[1, 2]"), a comma separated string, a list of ids or None."""
+    if value is None:
+        return []
+    if isinstance(value, (bytes, bytearray)):
+        value = value.decode('utf-8')
+    if isinstance(value, str):
+        if value.startswith('['):
+            value = json.loads(value)
+        else:
+            return [v.strip() for v in value.split(',') if v.strip()]
+    return [str(int(v)) for v in value]
+
+
+def tokenize_app(row: Dict[str, Any]) -> List[str]:
+    """Turns one app row into the token list that gets hashed into its feature vector."""
+    from sklearn.feature_extraction.text import ENGLISH_STOP_WORDS
+    text = ' '.join(str(row.get(field) or '') for field in TEXT_FIELDS).lower()
+    tokens = [t for t in _TOKEN_PATTERN.findall(text) if t not in ENGLISH_STOP_WORDS]
+    for kind, field in STRUCTURED_FIELDS.items():
+        tokens.extend(f"{kind}:{item_id}" for item_id in _split_ids(row.get(field)))
+    return tokens
+
+
+def franchise_key(name: str) -> int:
+    """
+    Stable 64-bit id of the series a game (or DLC) belongs to, guessed from its name.
+    There is no franchise data in the catalog, so "The Witcher 3: Wild Hunt" and
+    "The Witcher 2" both reduce to "the witcher".
+    """
+    name = (name or '').lower().replace('\u2122', '').replace('\u00ae', '')
+    series = _SEQUEL_PATTERN.sub('', _SUBTITLE_PATTERN.split(name, maxsplit=1)[0]).strip() or name.strip()
+    return int.from_bytes(hashlib.blake2b(series.encode('utf-8'), digest_size=8).digest(), 'little', signed=True)
+
+
+def _hashing_vectorizer(n_features: int):
+    from sklearn.feature_extraction.text import HashingVectorizer
+    return HashingVectorizer(analyzer=tokenize_app, n_features=n_features,
+        alternate_sign=False, norm=None, dtype=np.float32)
+
+
+def _featurize_chunk(rows: List[Dict[str, Any]], n_features: int) -> Tuple[np.ndarray, List[str], Any, np.ndarray, np.ndarray]:
+    """
+    Process pool worker: hashes a chunk of app rows into a CSR matrix of raw term counts,
+    plus each app's base game (-1 for none) and franchise key for de-duplicating results.
+    """
+    counts = _hashing_vectorizer(n_features).transform(rows)
+    counts.sum_duplicates()
+    counts.sort_indices()
+    app_ids = np.array([int(r['id']) for r in rows], dtype=np.int64)
+    names = [_LINE_BREAKS.sub(' ', str(r.get('name') or '')) for r in rows]
+    base_game_ids = np.array([int(r.get('base_game_id') or -1) for r in rows], dtype=np.int64)
+    franchise_keys = np.array([franchise_key(name) for name in names], dtype=np.int64)
+    return app_ids, names, counts, base_game_ids, franchise_keys
+
+
+def iter_app_chunks_from_db(connection, chunk_size: int = 2000, min_reviews: int = 0, since_version: int = 0,
+        schema_yaml_path: str = SCHEMA_FILE) -> Iterator[List[Dict[str, Any]]]:
+    """
+    Streams app rows whose `app_features` changed after `since_version`, with an unbuffered
+    cursor so only one chunk is ever held in memory.
+    """
+    import pymysql
+    with open(schema_yaml_path, 'r') as f:
+        sql = yaml.safe_load(f)['queries']['recommender']['app_text']
+    cursor = connection.cursor(pymysql.cursors.SSDictCursor)
+    try:
+        cursor.execute(sql, (since_version, min_reviews))
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            yield rows
+    finally:
+        cursor.close()
+
+
+def fetch_feature_labels(connection, schema_yaml_path: str = SCHEMA_FILE) -> List[Dict[str, Any]]:
+    """Reads the tag, genre and category names as {"kind", "id", "name"} rows."""
+    import pymysql
+    with open(schema_yaml_path, 'r') as f:
+        sql = yaml.safe_load(f)['queries']['recommender']['feature_labels']
+    with connection.cursor(pymysql.cursors.DictCursor) as cursor:
+        cursor.execute(sql)
+        return list(cursor.fetchall())
+
+
+def iter_app_chunks_from_snapshot(path: str, chunk_size: int = 2000) -> Iterator[List[Dict[str, Any]]]:
+    """Streams app rows from a parquet snapshot with the same columns as the `app_text` query."""
+    import pyarrow.parquet as pq
+    parquet_file = pq.ParquetFile(path)
+    wanted = ('id', *TEXT_FIELDS, *STRUCTURED_FIELDS.values(), 'base_game_id', 'change_version')
+    columns = [c for c in wanted if c in parquet_file.schema_arrow.names]
+    for batch in parquet_file.iter_batches(batch_size=chunk_size, columns=columns):
+        yield batch.to_pylist()
+
+
+class FeatureStore:
+    """
+    Append-only, on-disk CSR matrix of hashed app features.
+
+    Raw term counts and document frequencies are kept so new or updated apps can be
+    added without re-tokenizing the catalog; `reweight` then rebuilds the tf-idf
+    weights in one vectorized pass. Every array is a flat binary file so the model
+    can be memory-mapped and shared between processes.
+    """
+    ARRAYS = {
+        'app_ids': np.int64, 'live': np.uint8, 'indptr': np.int64,
+        'indices': np.int32, 'counts': np.float32, 'weights': np.float32, 'doc_freq': np.int64,
+        'base_game_ids': np.int64, 'franchise_keys': np.int64,
+    }
+
+    def __init__(self, path: str, n_features: int = 2 ** 20):
+        self.path = path
+        meta_path = os.path.join(path, 'meta.json')
+        if os.path.exists(meta_path):
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                self.meta = json.load(f)
+        else:
+            os.makedirs(path, exist_ok=True)
+            self.meta = {'n_features': n_features, 'n_rows': 0, 'nnz': 0, 'weighted_nnz': 0, 'change_version': 0}
+            np.zeros(1, dtype=np.int64).tofile(self._file('indptr'))
+            np.zeros(n_features, dtype=np.int64).tofile(self._file('doc_freq'))
+            for name in ('app_ids', 'live', 'indices', 'counts', 'weights', 'base_game_ids', 'franchise_keys'):
+                open(self._file(name), 'wb').close()
+            open(os.path.join(path, 'names.txt'), 'w', encoding='utf-8').close()
+            self._save_meta()
+
+    @property
+    def n_features(self) -> int:
+        return self.meta['n_features']
+
+    @property
+    def n_rows(self) -> int:
+        return self.meta['n_rows']
+
+    @property
+    def change_version(self) -> int:
+        """Highest `app_features.change_version` already in the store; the next refresh starts after it."""
+        return self.meta.get('change_version', 0)
+
+    def _file(self, name: str) -> str:
+        return os.path.join(self.path, f"{name}.bin")
+
+    def _save_meta(self):
+        with open(os.path.join(self.path, 'meta.json'), 'w', encoding='utf-8') as f:
+            json.dump(self.meta, f)
+
+    def array(self, name: str, mode: str = 'r') -> np.ndarray:
+        """Memory-maps one of the store's arrays."""
+        dtype = self.ARRAYS[name]
+        if os.path.getsize(self._file(name)) == 0:
+            return np.zeros(0, dtype=dtype)
+        return np.memmap(self._file(name), dtype=dtype, mode=mode)
+
+    def names(self) -> List[str]:
+        with open(os.path.join(self.path, 'names.txt'), 'r', encoding='utf-8') as f:
+            return f.read().splitlines()
+
+    def set_labels(self, rows: Iterable[Dict[str, Any]]):
+        """
+        Maps the hashed columns of structured tokens ("tag:42") back to their lookup-table
+        names, hashing each one exactly as the featurizer does.
+        """
+        rows = [r for r in rows if r['kind'] in STRUCTURED_FIELDS]
+        if not rows:
+            return
+        hashed = _hashing_vectorizer(self.n_features).transform(
+            [{STRUCTURED_FIELDS[r['kind']]: [r['id']]} for r in rows])
+        labels = {'columns': hashed.indices.tolist(), 'kinds': [r['kind'] for r in rows],
+            'names': [str(r['name']) for r in rows]}
+        with open(os.path.join(self.path, 'labels.json'), 'w', encoding='utf-8') as f:
+            json.dump(labels, f)
+        logging.info(f"Stored names for {len(rows)} tags, genres and categories")
+
+    def labels(self) -> Dict[str, list]:
+        """Hashed column, kind and name of every known tag, genre and category; empty until `set_labels`."""
+        path = os.path.join(self.path, 'labels.json')
+        if not os.path.exists(path):
+            return {'columns': [], 'kinds': [], 'names': []}
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def matrix(self, weighted: bool = True):
+        """Returns the memory-mapped feature matrix as a scipy CSR matrix (no copy)."""
+        from scipy.sparse import csr_matrix
+        if weighted and self.meta['weighted_nnz'] != self.meta['nnz']:
+            raise RuntimeError("Feature weights are stale, call reweight() first")
+        data = self.array('weights' if weighted else 'counts')
+        return csr_matrix((data, self.array('indices'), self.array('indptr')),
+            shape=(self.n_rows, self.n_features), copy=False)
+
+    def add_apps(self, chunks: Iterable[List[Dict[str, Any]]], workers: Optional[int] = None) -> int:
+        """
+        Tokenizes chunks of app rows in a process pool and appends them to the store.
+        Apps that are already present are superseded by the new row.
+        """
+        workers = workers or os.cpu_count() or 1
+        added = 0
+        # Rows arrive ordered by change_version and one version can span many chunks, so a version
+        # only counts as stored once a later one shows up, or the stream ends without an error.
+        complete, last = self.change_version, self.change_version
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            pending = deque()
+            try:
+                for rows in chunks:
+                    for row in rows:
+                        version = row.get('change_version') or 0
+                        if version > last:
+                            complete, last = last, version
+                    pending.append((pool.submit(_featurize_chunk, rows, self.n_features), complete))
+                    # Keep the number of in-flight chunks bounded so memory stays flat.
+                    if len(pending) >= 2 * workers:
+                        future, version = pending.popleft()
+                        added += self._append(*future.result(), change_version=version)
+            finally:
+                # Chunks already read are stored even if the source fails, so a rerun redoes less.
+                while pending:
+                    future, version = pending.popleft()
+                    added += self._append(*future.result(), change_version=version)
+        self.meta['change_version'] = last
+        self._save_meta()
+        logging.info(f"Featurized {added} apps, store now holds {self.n_rows} rows")
+        return added
+
+    def _append(self, app_ids: np.ndarray, names: List[str], counts, base_game_ids: np.ndarray,
+            franchise_keys: np.ndarray, change_version: int = 0) -> int:
+        # Within a chunk the last row of a repeated app wins.
+        _, last = np.unique(app_ids[::-1], return_index=True)
+        keep = np.zeros(len(app_ids), dtype=bool)
+        keep[len(app_ids) - 1 - last] = True
+        self._retire(app_ids[keep])
+
+        counts = counts[keep]
+        doc_freq = self.array('doc_freq', mode='r+')
+        doc_freq += np.bincount(counts.indices, minlength=self.n_features)
+        doc_freq.flush()
+
+        indptr = counts.indptr[1:].astype(np.int64) + self.meta['nnz']
+        with open(self._file('app_ids'), 'ab') as f: app_ids[keep].tofile(f)
+        with open(self._file('live'), 'ab') as f: np.ones(keep.sum(), dtype=np.uint8).tofile(f)
+        with open(self._file('base_game_ids'), 'ab') as f: base_game_ids[keep].tofile(f)
+        with open(self._file('franchise_keys'), 'ab') as f: franchise_keys[keep].tofile(f)
+        with open(self._file('indptr'), 'ab') as f: indptr.tofile(f)
+        with open(self._file('indices'), 'ab') as f: counts.indices.astype(np.int32).tofile(f)
+        with open(self._file('counts'), 'ab') as f: counts.data.astype(np.float32).tofile(f)
+        with open(os.path.join(self.path, 'names.txt'), 'a', encoding='utf-8', newline='') as f:
+            f.writelines(f"{name}\n" for name, k in zip(names, keep) if k)
+
+        self.meta['n_rows'] += int(keep.sum())
+        self.meta['nnz'] += int(counts.nnz)
+        # `change_version` is the newest version whose rows are all stored once this chunk is.
+        self.meta['change_version'] = max(self.change_version, int(change_version))
+        self._save_meta()
+        return int(keep.sum())
+
+    def _retire(self, app_ids: np.ndarray):
+        """Marks older rows of re-added apps as dead and removes them from the document frequencies."""
+        if self.n_rows == 0:
+            return
+        live = self.array('live', mode='r+')
+        stale = np.flatnonzero(np.isin(self.array('app_ids'), app_ids) & (live == 1))
+        if len(stale) == 0:
+            return
+        indptr, indices = self.array('indptr'), self.array('indices')
+        doc_freq = self.array('doc_freq', mode='r+')
+        stale_indices = np.concatenate([indices[indptr[row]:indptr[row + 1]] for row in stale])
+        doc_freq -= np.bincount(stale_indices, minlength=self.n_features)
+        live[stale] = 0
+        live.flush()
+        doc_freq.flush()
+
+    def reweight(self, block_rows: int = 50000):
+        """Rebuilds the sublinear tf-idf, l2-normalized weights from the raw counts, block by block."""
+        nnz = self.meta['nnz']
+        if nnz == 0:
+            return
+        live = self.array('live')
+        n_docs = int(live.sum())
+        idf = (np.log((1.0 + n_docs) / (1.0 + self.array('doc_freq'))) + 1.0).astype(np.float32)
+        indptr, indices, counts = self.array('indptr'), self.array('indices'), self.array('counts')
+        weights = np.memmap(self._file('weights'), dtype=np.float32, mode='w+', shape=(nnz, ))
+        for start in range(0, self.n_rows, block_rows):
+            stop = min(start + block_rows, self.n_rows)
+            lo, hi = indptr[start], indptr[stop]
+            row_of = np.repeat(np.arange(stop - start), np.diff(indptr[start:stop + 1]))
+            w = (1.0 + np.log(counts[lo:hi])) * idf[indices[lo:hi]]
+            w *= live[start:stop][row_of]
+            norms = np.sqrt(np.bincount(row_of, weights=w * w, minlength=stop - start))
+            norms[norms == 0] = 1.0
+            weights[lo:hi] = w / norms[row_of]
+        weights.flush()
+        self.meta['weighted_nnz'] = nnz
+        self._save_meta()
+        logging.info(f"Reweighted {self.n_rows} rows ({n_docs} live) over {nnz} non-zeros")
+
+
+OWNED_GAMES_URL = "http://api.steampowered.com/IPlayerService/GetOwnedGames/v0001/"
+
+
+def fetch_owned_games(api_key: str, steam_id: str, timeout: int = 20) -> List[Dict[str, Any]]:
+    """Fetches a user's owned games (with app IDs) from the Steam Web API."""
+    import requests
+    params = {"key": api_key, "steamid": steam_id, "include_appinfo": True, "format": "json"}
+    response = requests.get(OWNED_GAMES_URL, params=params, timeout=timeout)
+    response.raise_for_status()
+    return response.json().get("response", {}).get("games", [])
+
+
+class Library:
+    """
+    A user's games as parallel arrays keyed by app ID, most played first.
+    `rows` holds each game's row in the feature store, or -1 if it isn't in the catalog.
+    """
+    def __init__(self, app_ids, names, playtime_hours, rows=None):
+        self.app_ids = np.asarray(app_ids, dtype=np.int64)
+        self.names = np.asarray(names, dtype=object)
+        self.playtime_hours = np.asarray(playtime_hours, dtype=np.float32)
+        self.rows = np.full(len(self.app_ids), -1, dtype=np.int64) if rows is None else np.asarray(rows, dtype=np.int64)
+
+    @classmethod
+    def from_owned_games(cls, games: List[Dict[str, Any]]) -> 'Library':
+        """Builds a library from a GetOwnedGames response, sorted by playtime once."""
+        app_ids = np.fromiter((g['appid'] for g in games), dtype=np.int64, count=len(games))
+        minutes = np.fromiter((g.get('playtime_forever', 0) for g in games), dtype=np.float32, count=len(games))
+        names = np.array([g.get('name', '') for g in games], dtype=object)
+        order = np.argsort(-minutes, kind='stable')
+        return cls(app_ids[order], names[order], np.round(minutes[order] / 60, 1))
+
+    def __len__(self) -> int:
+        return len(self.app_ids)
+
+    def fingerprint(self) -> str:
+        """
+        Hash of the owned app IDs and their log2 playtime buckets. It stays the same while a
+        library barely changes, which is when a precomputed answer can still be served.
+        """
+        order = np.argsort(self.app_ids, kind='stable')
+        buckets = np.floor(np.log2(1.0 + self.playtime_hours[order])).astype(np.int8)
+        return hashlib.sha1(self.app_ids[order].tobytes() + buckets.tobytes()).hexdigest()
+
+    def take(self, index) -> 'Library':
+        return Library(self.app_ids[index], self.names[index], self.playtime_hours[index], self.rows[index])
+
+    def select(self, app_ids, playtime_hours=None) -> 'Library':
+        """The games with the given app IDs, optionally with playtimes edited in the UI."""
+        app_ids = np.asarray(app_ids, dtype=np.int64)
+        subset = self.take(np.flatnonzero(np.isin(self.app_ids, app_ids)))
+        if playtime_hours is not None:
+            order = np.argsort(app_ids)
+            subset.playtime_hours = np.asarray(playtime_hours, dtype=np.float32)[
+                order[np.searchsorted(app_ids, subset.app_ids, sorter=order)]]
+        return subset
+
+    def to_frame(self):
+        """The library editor's table, indexed by app ID so edits map straight back to games."""
+        import pandas as pd
+        return pd.DataFrame({'Select': False, 'Game': self.names, 'Playtime (hours)': self.playtime_hours},
+            index=pd.Index(self.app_ids, name='App ID'))
+
+
+class Recommendations:
+    """Top-N results for one user as parallel arrays, best first. `reasons` is '' where none is known."""
+    def __init__(self, app_ids, names, scores, rows, reasons=None):
+        self.app_ids = np.asarray(app_ids, dtype=np.int64)
+        self.names = np.asarray(names, dtype=object)
+        self.scores = np.asarray(scores, dtype=np.float32)
+        self.rows = np.asarray(rows, dtype=np.int64)
+        self.reasons = np.full(len(self.app_ids), '', dtype=object) if reasons is None else np.asarray(reasons, dtype=object)
+
+    def __len__(self) -> int:
+        return len(self.app_ids)
+
+    def head(self, n: int) -> 'Recommendations':
+        return Recommendations(self.app_ids[:n], self.names[:n], self.scores[:n], self.rows[:n], self.reasons[:n])
+
+    def to_frame(self):
+        import pandas as pd
+        columns = {'Game': self.names, 'Score': np.round(self.scores, 3)}
+        if any(self.reasons):
+            columns['Reason'] = self.reasons
+        return pd.DataFrame(columns, index=pd.Index(self.app_ids, name='App ID'))
+
+
 class RecommendationEngine:
-    def __init__(self, data):
+    # Part of `model_version`, so precomputed results are recomputed when the ranking changes.
+    RANKER = 'mmr'
+    # At most this many recommendations come from one franchise.
+    MAX_PER_FRANCHISE = 2
+    # diverse_candidates() looks at most this many times k apps deep before settling for fewer.
+    MAX_OVERFETCH = 32
+
+    def __init__(self, data: FeatureStore):
         self.data = data
+        self.features = data.matrix()
+        self.app_ids = data.array('app_ids')
+        self.names = np.array(data.names(), dtype=object)
+        self.live = data.array('live').astype(bool)
+        # A DLC belongs with its base game; a game is its own family.
+        base_game_ids = data.array('base_game_ids')
+        self.families = np.where(base_game_ids >= 0, base_game_ids, self.app_ids)
+        self.franchises = data.array('franchise_keys')
+        # Hashed column -> tag/genre/category name, as sorted columns for a searchsorted lookup.
+        labels = data.labels()
+        order = np.argsort(labels['columns'], kind='stable')
+        self._label_columns = np.asarray(labels['columns'], dtype=np.int64)[order]
+        self._label_kinds = np.asarray(labels['kinds'], dtype=object)[order]
+        self._label_names = np.asarray(labels['names'], dtype=object)[order]
+        # App ID -> row index map, as sorted ids plus their rows, so a whole library joins in one searchsorted.
+        live_rows = np.flatnonzero(self.live)
+        order = np.argsort(self.app_ids[live_rows], kind='stable')
+        self._index_ids = np.asarray(self.app_ids[live_rows][order])
+        self._index_rows = live_rows[order]
+
+    @classmethod
+    def load(cls, model_dir: str) -> 'RecommendationEngine':
+        return cls(FeatureStore(model_dir))
+
+    @property
+    def model_version(self) -> str:
+        """Identifies the feature store contents; precomputed results from another version are stale."""
+        meta = self.data.meta
+        return f"{meta.get('change_version', 0)}-{meta['n_rows']}-{meta['nnz']}-{self.RANKER}"
+
+    def rows_for(self, app_ids) -> np.ndarray:
+        """Catalog rows for the given app IDs, -1 for apps that aren't in the catalog."""
+        app_ids = np.asarray(app_ids, dtype=np.int64)
+        if len(self._index_ids) == 0:
+            return np.full(len(app_ids), -1, dtype=np.int64)
+        pos = np.minimum(np.searchsorted(self._index_ids, app_ids), len(self._index_ids) - 1)
+        return np.where(self._index_ids[pos] == app_ids, self._index_rows[pos], -1)
+
+    def hydrate(self, library: Library) -> Library:
+        """Links every game in the library to its catalog row in one vectorized join."""
+        library.rows = self.rows_for(library.app_ids)
+        return library
+
+    @staticmethod
+    def _playtime_weights(library: Library) -> Tuple[np.ndarray, np.ndarray]:
+        """Positions of the library's games that are in the catalog, and their log-playtime weights."""
+        in_catalog = np.flatnonzero(library.rows >= 0)
+        w = np.log1p(library.playtime_hours[in_catalog]).astype(np.float32)
+        if not w.any():
+            w = np.ones_like(w)  # nothing played yet, so every selected game counts the same
+        return in_catalog, w
+
+    def _library_matrix(self, libraries: List[Library]):
+        """Libraries x catalog rows sparse matrix of log-playtime weights."""
+        from scipy.sparse import csr_matrix
+        indptr, rows, weights = [0], [], []
+        for library in libraries:
+            in_catalog, w = self._playtime_weights(library)
+            rows.append(library.rows[in_catalog])
+            weights.append(w)
+            indptr.append(indptr[-1] + len(w))
+        return csr_matrix((np.concatenate(weights), np.concatenate(rows), np.array(indptr)),
+            shape=(len(libraries), self.data.n_rows))
+
+    def score(self, libraries: List[Library], excludes: Optional[List[np.ndarray]] = None) -> np.ndarray:
+        """
+        Cosine similarity of every catalog app to each library's playtime-weighted profile,
+        as a libraries x catalog array. Owned, excluded and retired apps score -inf, as does
+        everything for a library with no games in the catalog.
+        """
+        from scipy.sparse import diags
+        weights = self._library_matrix(libraries)
+        profiles = weights @ self.features
+        norms = np.sqrt(np.asarray(profiles.multiply(profiles).sum(axis=1)).ravel())
+        empty = norms == 0
+        norms[empty] = 1.0
+        profiles = diags(1.0 / norms) @ profiles
+        scores = np.asarray((self.features @ profiles.T).toarray().T, dtype=np.float32)
+        # Without a profile every app would tie at 0, so nothing is recommended at all.
+        scores[empty] = -np.inf
+
+        # Not weights.nonzero(): unplayed games carry an explicit zero weight but are still owned.
+        owned_users = np.repeat(np.arange(len(libraries)), np.diff(weights.indptr))
+        scores[owned_users, weights.indices] = -np.inf
+        scores[:, ~self.live] = -np.inf
+        for user, exclude in enumerate(excludes or []):
+            rows = self.rows_for(exclude)
+            scores[user, rows[rows >= 0]] = -np.inf
+        return scores
+
+    @staticmethod
+    def top_n(scores: np.ndarray, n: int) -> np.ndarray:
+        """Row-wise indices of the n best scores, best first, for a libraries x catalog array."""
+        n = min(n, scores.shape[1])
+        part = np.argpartition(-scores, n - 1, axis=1)[:, :n]
+        order = np.argsort(-np.take_along_axis(scores, part, axis=1), axis=1, kind='stable')
+        return np.take_along_axis(part, order, axis=1)
+
+    def _candidate_similarity(self, candidates: np.ndarray) -> np.ndarray:
+        """
+        Dense libraries x K x K cosine similarities between each library's K candidates.
+        Only features that two or more of a library's candidates share can add to an
+        off-diagonal entry, so each block is a small dense product over just those columns
+        (the diagonal is left incomplete).
+        """
+        n_users, k = candidates.shape
+        block = self.features[candidates.ravel()]
+        user_of = np.repeat(np.arange(n_users * k), np.diff(block.indptr)) // k
+        # (library, feature) keys sort by library first, so each library's shared columns are one contiguous run.
+        keys, inverse, counts = np.unique(user_of * self.data.n_features + block.indices,
+            return_inverse=True, return_counts=True)
+        shared = counts > 1
+        column = np.cumsum(shared) - 1
+        starts = np.searchsorted(keys[shared] // self.data.n_features, np.arange(n_users + 1))
+        keep = shared[inverse]
+        local_row = np.repeat(np.arange(n_users * k) % k, np.diff(block.indptr))
+
+        similarity = np.zeros((n_users, k, k), dtype=np.float32)
+        for user in range(n_users):
+            lo, hi = block.indptr[user * k], block.indptr[(user + 1) * k]
+            entries = lo + np.flatnonzero(keep[lo:hi])
+            dense = np.zeros((k, starts[user + 1] - starts[user]), dtype=np.float32)
+            dense[local_row[entries], column[inverse[entries]] - starts[user]] = block.data[entries]
+            similarity[user] = dense @ dense.T
+        return similarity
+
+    def _distinct(self, top: np.ndarray, max_per_franchise: int) -> np.ndarray:
+        """
+        Mask over libraries x ranked rows (best first, -1 for none) keeping only the best app of
+        each family and, among those, the best `max_per_franchise` of each franchise.
+        """
+        n_users, n = top.shape
+        valid = top >= 0
+        users = np.repeat(np.arange(n_users), n)
+        rank = np.tile(np.arange(n), n_users)
+        keep = valid.ravel().copy()
+        for groups, limit in ((self.families, 1), (self.franchises, max_per_franchise)):
+            group = np.where(valid, groups[np.maximum(top, 0)], 0).ravel()
+            # Rank of each kept app within its (library, group), counting only apps still kept.
+            order = np.lexsort((rank, group, users, ~keep))
+            new_group = np.ones(len(order), dtype=bool)
+            new_group[1:] = (users[order][1:] != users[order][:-1]) | (group[order][1:] != group[order][:-1])
+            position = np.arange(len(order))
+            position -= np.maximum.accumulate(np.where(new_group, position, 0))
+            within = np.empty_like(position)
+            within[order] = position
+            keep &= within < limit
+        return keep.reshape(n_users, n)
+
+    def diverse_candidates(self, scores: np.ndarray, k: int, max_per_franchise: int = MAX_PER_FRANCHISE) -> np.ndarray:
+        """
+        Each library's k best rows after dropping family duplicates and franchise overflow, -1
+        padded. The over-fetch grows while a library has fewer than k distinct apps, so a
+        game with hundreds of DLCs can't crowd every other candidate out, but stops at
+        `MAX_OVERFETCH * k` apps; a library still short then gets fewer candidates.
+        """
+        n_users, n_rows = scores.shape
+        candidates = np.full((n_users, k), -1, dtype=np.int64)
+        if n_rows == 0 or k == 0:
+            return candidates
+        # Start with some slack, since a few of the best apps are usually duplicates.
+        pending, pool, max_pool = np.arange(n_users), 2 * k, min(self.MAX_OVERFETCH * k, n_rows)
+        while len(pending):
+            pool = min(pool, max_pool)
+            pending_scores = scores if len(pending) == n_users else scores[pending]
+            top = self.top_n(pending_scores, pool)
+            top[~np.isfinite(np.take_along_axis(pending_scores, top, axis=1))] = -1
+            keep = self._distinct(top, max_per_franchise)
+            first = np.argsort(~keep, axis=1, kind='stable')[:, :k]
+            chosen = np.where(np.take_along_axis(keep, first, axis=1), np.take_along_axis(top, first, axis=1), -1)
+            candidates[pending, :chosen.shape[1]] = chosen
+            # Done once k are found, the ranking reached -inf scores, or the over-fetch hit its cap.
+            short = (keep.sum(axis=1) < k) & (top[:, -1] >= 0) & (pool < max_pool)
+            pending, pool = pending[short], pool * 4
+        return candidates
+
+    def diversify(self, scores: np.ndarray, candidates: np.ndarray, top_n: int, mmr_lambda: float = 0.7,
+            max_per_franchise: int = MAX_PER_FRANCHISE) -> np.ndarray:
+        """
+        Greedy maximal marginal relevance over each library's over-fetched candidates, all
+        libraries at once: every step picks the candidate maximizing
+        `mmr_lambda * score - (1 - mmr_lambda) * max similarity to the picks so far`.
+        Only one app per base game family (a game and its DLCs) and at most
+        `max_per_franchise` per franchise are picked. Candidates may be -1 padded; returns
+        libraries x top_n rows, -1 padded when a library runs out of candidates.
+        """
+        n_users, k = candidates.shape
+        picked = np.full((n_users, top_n), -1, dtype=np.int64)
+        valid = candidates >= 0
+        if not valid.any():
+            return picked
+        users = np.arange(n_users)
+        candidates = np.where(valid, candidates, 0)
+        relevance = np.take_along_axis(scores, candidates, axis=1)
+        blocked = ~valid | ~np.isfinite(relevance)
+        relevance[blocked] = 0.0
+        similarity = self._candidate_similarity(candidates)
+        families, franchises = self.families[candidates], self.franchises[candidates]
+        franchise_counts = np.zeros((n_users, k), dtype=np.int32)
+        max_similarity = np.zeros((n_users, k), dtype=np.float32)
+        for step in range(min(top_n, k)):
+            mmr = mmr_lambda * relevance - (1.0 - mmr_lambda) * max_similarity
+            mmr[blocked] = -np.inf
+            choice = np.argmax(mmr, axis=1)
+            found = np.isfinite(mmr[users, choice])
+            if not found.any():
+                break
+            picked[found, step] = candidates[found, choice[found]]
+            blocked |= families == families[users, choice][:, None]
+            franchise_counts += franchises == franchises[users, choice][:, None]
+            blocked |= franchise_counts >= max_per_franchise
+            np.maximum(max_similarity, similarity[users, choice], out=max_similarity)
+        return picked
+
+    def _recommendations(self, scores: np.ndarray, rows: np.ndarray) -> Recommendations:
+        rows = rows[rows >= 0]
+        rows = rows[np.isfinite(scores[rows])]
+        return Recommendations(self.app_ids[rows], self.names[rows], scores[rows], rows)
+
+    @staticmethod
+    def _reason(labels: List[Tuple[str, str]], game: str, hours: float) -> str:
+        played = f"which you played {round(hours, 1):g}h" if hours > 0 else "which is in your library"
+        if not labels:
+            return f"Similar to {game}, {played}"
+        grouped = {}
+        for kind, name in labels:
+            grouped.setdefault(kind, []).append(name)
+        shared = ' and '.join(f"{kind if len(names) == 1 else _KIND_PLURALS[kind]} {', '.join(names)}"
+            for kind, names in grouped.items())
+        return f"Shares {shared} with {game}, {played}"
+
+    def explain_many(self, libraries: List[Library], recommendations: List[Recommendations],
+            max_labels: int = 3, max_games: int = 32) -> List[Recommendations]:
+        """
+        Fills in why each recommendation was made: the library game contributing most to its
+        score (playtime weight times similarity) and the tags, genres and categories the two
+        share, strongest first. Only the final top-N are explained, only over their own columns,
+        and only against the `max_games` library games with the largest weights in the profile,
+        so the cost doesn't grow with the size of the library.
+        """
+        from scipy.sparse import csr_matrix
+        for library, recs in zip(libraries, recommendations):
+            in_catalog, w = self._playtime_weights(library)
+            candidates = self.features[recs.rows]
+            if len(in_catalog) == 0 or candidates.nnz == 0:
+                continue
+            if len(w) > max_games:
+                top_games = np.argpartition(-w, max_games - 1)[:max_games]
+                in_catalog, w = in_catalog[top_games], w[top_games]
+            columns, inverse = np.unique(candidates.indices, return_inverse=True)
+            dense = np.zeros((len(recs), len(columns)), dtype=np.float32)
+            dense[np.repeat(np.arange(len(recs)), np.diff(candidates.indptr)), inverse] = candidates.data
+            owned_rows = library.rows[in_catalog]
+            owned = self.features[owned_rows]
+            pos = np.minimum(np.searchsorted(columns, owned.indices), len(columns) - 1)
+            owned = csr_matrix((np.where(columns[pos] == owned.indices, owned.data, 0), pos, owned.indptr),
+                shape=(len(owned_rows), len(columns)))
+            contributions = (owned @ dense.T).T * w
+            best = np.argmax(contributions, axis=1)
+
+            # Per recommendation, how much each named feature it shares with its best game adds.
+            label_pos = np.minimum(np.searchsorted(self._label_columns, columns), max(len(self._label_columns) - 1, 0))
+            named = self._label_columns[label_pos] == columns if len(self._label_columns) else np.zeros(len(columns), bool)
+            shared = dense * owned[best].toarray() * named
+            strongest = np.argsort(-shared, axis=1, kind='stable')[:, :max_labels]
+            for i, j in enumerate(best):
+                if contributions[i, j] <= 0:
+                    continue
+                labels = label_pos[strongest[i][shared[i, strongest[i]] > 0]]
+                game = library.names[in_catalog[j]] or self.names[owned_rows[j]]
+                recs.reasons[i] = self._reason(list(zip(self._label_kinds[labels], self._label_names[labels])),
+                    game, float(library.playtime_hours[in_catalog[j]]))
+        return recommendations
+
+    def recommend(self, library: Library, top_n: int = 20, exclude=None) -> Recommendations:
+        """
+        Recommends catalog games for a hydrated library. Games in the library, and any app IDs
+        in `exclude` (e.g. the rest of the user's library when only a selection is passed),
+        are never recommended.
+        """
+        return self.recommend_many([library], top_n, [exclude] if exclude is not None else None)[0]
+
+    def recommend_many(self, libraries: List[Library], top_n: int = 20,
+            excludes: Optional[List[np.ndarray]] = None, diversify: bool = True,
+            candidate_factor: int = 4, explain: bool = True) -> List[Recommendations]:
+        """
+        Scores a block of libraries in one sparse product; memory grows with len(libraries) x catalog.
+        With `diversify`, the best `candidate_factor * top_n` distinct apps are re-ranked by `diversify()`;
+        with `explain`, the results come with reasons from `explain_many()`.
+        """
+        scores = self.score(libraries, excludes)
+        if diversify:
+            top = self.diversify(scores, self.diverse_candidates(scores, candidate_factor * top_n), top_n)
+        else:
+            top = self.top_n(scores, top_n)
+        recommendations = [self._recommendations(scores[i], top[i]) for i in range(len(libraries))]
+        return self.explain_many(libraries, recommendations) if explain else recommendations
+
+    def recommend_for_user(self, steam_id: str, library: Library, results: Optional['BatchResults'] = None,
+            top_n: int = 20) -> Recommendations:
+        """Serves the batch job's answer while the library fingerprint and model still match, else scores live."""
+        if results is not None:
+            cached = results.get(steam_id, library.fingerprint(), self.model_version)
+            if cached is not None:
+                app_ids, scores = cached
+                rows = self.rows_for(app_ids)
+                recs = Recommendations(app_ids, self.names[rows], scores, rows).head(top_n)
+                return self.explain_many([library], [recs])[0]
+        return self.recommend(library, top_n)
+
+
+class BatchResults:
+    """
+    Precomputed top-N recommendations keyed by Steam ID, in a SQLite file so the online
+    path can look one user up without a database server.
+    """
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS user_recommendations (
+            steam_id TEXT PRIMARY KEY, library_fingerprint TEXT NOT NULL, model_version TEXT NOT NULL,
+            app_ids TEXT NOT NULL, scores TEXT NOT NULL, computed_at TEXT DEFAULT CURRENT_TIMESTAMP
+        )"""
+
+    def __init__(self, path: str):
+        import sqlite3
+        # Streamlit shares one instance across its script threads; writes only happen in the batch job.
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute(self.SCHEMA)
+
+    def put_many(self, rows: List[Tuple[str, str, str, str, str]]) -> int:
+        """Rows are (steam_id, library_fingerprint, model_version, app_ids JSON, scores JSON)."""
+        self.connection.executemany(
+            "INSERT OR REPLACE INTO user_recommendations (steam_id, library_fingerprint, model_version, app_ids, scores) "
+            "VALUES (?, ?, ?, ?, ?)", rows)
+        self.connection.commit()
+        return len(rows)
+
+    def get(self, steam_id: str, fingerprint: str, model_version: str) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        row = self.connection.execute(
+            "SELECT app_ids, scores FROM user_recommendations "
+            "WHERE steam_id = ? AND library_fingerprint = ? AND model_version = ?",
+            (str(steam_id), fingerprint, model_version)).fetchone()
+        if row is None:
+            return None
+        return np.array(json.loads(row[0]), dtype=np.int64), np.array(json.loads(row[1]), dtype=np.float32)
+
+    def close(self):
+        self.connection.close()
+
+
+def iter_steam_ids(path: str) -> Iterator[Tuple[str, None]]:
+    """One Steam ID per line; libraries are fetched from the Steam API inside the workers."""
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                yield line.strip(), None
+
+
+def iter_library_snapshot(path: str) -> Iterator[Tuple[str, List[Dict[str, Any]]]]:
+    """JSON lines of {"steam_id": ..., "games": [GetOwnedGames entries]}."""
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                yield str(record['steam_id']), record['games']
+
+
+# Per-process state of batch workers; the engine memory-maps the model once per worker.
+_BATCH_WORKER: Dict[str, Any] = {}
+
+
+def _init_batch_worker(model_dir: str, api_key: Optional[str]):
+    _BATCH_WORKER['engine'] = RecommendationEngine.load(model_dir)
+    _BATCH_WORKER['api_key'] = api_key
+
+
+def _recommend_shard(items: List[Tuple[str, Optional[list]]], top_n: int, block_size: int) -> List[tuple]:
+    """Process pool worker: hydrates a shard of libraries and scores them in vectorized blocks."""
+    import requests
+    engine = _BATCH_WORKER['engine']
+    steam_ids, libraries = [], []
+    for steam_id, games in items:
+        if games is None:
+            try:
+                games = fetch_owned_games(_BATCH_WORKER['api_key'], steam_id)
+            except requests.exceptions.RequestException as e:
+                logging.warning(f"Skipping {steam_id}, could not fetch library: {e}")
+                continue
+        library = engine.hydrate(Library.from_owned_games(games))
+        if (library.rows >= 0).any():  # private or empty libraries have nothing to score
+            steam_ids.append(steam_id)
+            libraries.append(library)
+
+    rows = []
+    for start in range(0, len(libraries), block_size):
+        block = libraries[start:start + block_size]
+        for steam_id, library, recs in zip(steam_ids[start:start + block_size], block, engine.recommend_many(block, top_n, explain=False)):
+            rows.append((steam_id, library.fingerprint(), engine.model_version,
+                json.dumps(recs.app_ids.tolist()), json.dumps(np.round(recs.scores, 5).tolist())))
+    return rows
+
+
+def run_batch(model_dir: str, items: Iterable[Tuple[str, Optional[list]]], output: str, workers: Optional[int] = None,
+        top_n: int = 20, shard_size: int = 256, block_size: int = 64, api_key: Optional[str] = None) -> int:
+    """Shards users across a process pool sharing the memory-mapped model and stores their top-N."""
+    workers = workers or os.cpu_count() or 1
+    results = BatchResults(output)
+    written = 0
+    items = iter(items)
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_batch_worker,
+                initargs=(model_dir, api_key)) as pool:
+            pending = deque()
+            while shard := list(islice(items, shard_size)):
+                pending.append(pool.submit(_recommend_shard, shard, top_n, block_size))
+                if len(pending) >= 2 * workers:
+                    written += results.put_many(pending.popleft().result())
+            while pending:
+                written += results.put_many(pending.popleft().result())
+    finally:
+        results.close()
+    logging.info(f"Stored recommendations for {written} users in {output}")
+    return written
+
+
+def _connect_db():
+    import pymysql
+    from dotenv import load_dotenv
+    load_dotenv()
+    return pymysql.connect(host=os.getenv('DB_HOST'), user=os.getenv('DB_USER'),
+        password=os.getenv('DB_PASSWORD'), database=os.getenv('DB_NAME'), charset='utf8mb4')
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    logging.basicConfig(level=logging.INFO, format='[%(levelname).1s %(asctime)s] %(message)s', datefmt='%H:%M:%S')
+    with open(CONFIG_FILE, 'r', encoding='utf-8') as f:
+        settings = yaml.safe_load(f)['recommender']
+
+    parser = argparse.ArgumentParser(description='Steam recommendation engine')
+    commands = parser.add_subparsers(dest='command', required=True)
+    featurize = commands.add_parser('featurize', help='Add apps from the database or a snapshot to the feature store.')
+    featurize.add_argument('--snapshot', help='Parquet snapshot to read instead of the database.')
+    featurize.add_argument('--labels', help='Parquet snapshot of tag/genre/category names (kind, id, name) '
+        'to explain recommendations with; read from the database otherwise.')
+    featurize.add_argument('--model-dir', default=settings['model_dir'])
+    featurize.add_argument('--workers', type=int, default=settings['workers'])
+    featurize.add_argument('--min-reviews', type=int, default=settings['min_reviews'])
+    batch = commands.add_parser('batch', help='Precompute recommendations for many users across a process pool.')
+    source = batch.add_mutually_exclusive_group(required=True)
+    source.add_argument('--steam-ids', help='File with one Steam ID per line; libraries are fetched from Steam.')
+    source.add_argument('--libraries', help='JSON lines snapshot of {"steam_id", "games"} records.')
+    batch.add_argument('--output', default=settings['batch_results'])
+    batch.add_argument('--model-dir', default=settings['model_dir'])
+    batch.add_argument('--workers', type=int, default=settings['workers'])
+    batch.add_argument('--top-n', type=int, default=settings['top_n'])
+    args = parser.parse_args(argv)
+
+    if args.command == 'featurize':
+        store = FeatureStore(args.model_dir, n_features=settings['n_features'])
+        if args.snapshot:
+            chunks = iter_app_chunks_from_snapshot(args.snapshot, settings['chunk_size'])
+            store.add_apps(chunks, workers=args.workers)
+            if args.labels:
+                import pyarrow.parquet as pq
+                store.set_labels(pq.read_table(args.labels, columns=['kind', 'id', 'name']).to_pylist())
+        else:
+            connection = _connect_db()
+            try:
+                chunks = iter_app_chunks_from_db(connection, settings['chunk_size'], args.min_reviews,
+                    since_version=store.change_version)
+                store.add_apps(chunks, workers=args.workers)
+                store.set_labels(fetch_feature_labels(connection))
+            finally:
+                connection.close()
+        store.reweight()
+    elif args.command == 'batch':
+        from dotenv import load_dotenv
+        load_dotenv()
+        items = iter_steam_ids(args.steam_ids) if args.steam_ids else iter_library_snapshot(args.libraries)
+        run_batch(args.model_dir, items, args.output, workers=args.workers, top_n=args.top_n,
+            shard_size=settings['batch_shard_size'], block_size=settings['batch_block_size'],
+            api_key=os.getenv('STEAM_API_KEY'))
+    return 0
+
 
-    def recommend(self, user_id):
-        # Implement recommendation logic here
-        pass
+if __name__ == '__main__':
+    sys.exit(main())
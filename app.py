@@ -1,56 +1,33 @@
-import streamlit as st
-import pandas as pd
-import requests
+# streamlit, pandas and requests are imported inside the functions that use them, so this
+# module can be imported (by tests, workers or the recommender) without loading them.
 import os
-from dotenv import load_dotenv
-
-# Load environment variables from a .env file
-load_dotenv()
-API_KEY = os.getenv("STEAM_API_KEY")
 
 # --- Steam API Functions ---
-@st.cache_data
 def get_owned_games(api_key, steam_id):
-    """Fetches a user's owned games from their Steam ID."""
-    url = "http://api.steampowered.com/IPlayerService/GetOwnedGames/v0001/"
-    params = {
-        "key": api_key,
-        "steamid": steam_id,
-        "include_appinfo": True,
-        "format": "json"
-    }
+    """Fetches a user's owned games from their Steam ID, keyed by app ID."""
+    import requests
+    import streamlit as st
+    from RecommendationEngine import Library, fetch_owned_games
     try:
-        response = requests.get(url, params=params)
-        response.raise_for_status()  # Raise an exception for bad status codes
-        data = response.json().get("response", {})
-        if "games" in data:
-            games_list = data["games"]
-            # Convert to DataFrame
-            df = pd.DataFrame(games_list)
-            # Process DataFrame to be more user-friendly
-            df = df[['name', 'playtime_forever']].copy()
-            df.rename(columns={'name': 'Game', 'playtime_forever': 'Playtime (hours)'}, inplace=True)
-            df['Playtime (hours)'] = (df['Playtime (hours)'] / 60).round(1)
-            df['Select'] = False
-            # Reorder columns for the UI
-            df = df[['Select', 'Game', 'Playtime (hours)']]
-            return df.sort_values(by='Playtime (hours)', ascending=False)
+        return Library.from_owned_games(fetch_owned_games(api_key, steam_id))
     except requests.exceptions.RequestException as e:
         st.error(f"Error fetching game library: {e}")
-    return pd.DataFrame() # Return an empty DataFrame on error
+    return Library([], [], []) # Return an empty library on error
 
-# --- Streamlit App Layout ---
+def load_engine(model_dir):
+    """Memory-maps the recommender model, or returns None if it hasn't been built yet."""
+    from RecommendationEngine import RecommendationEngine
+    if not os.path.exists(os.path.join(model_dir, 'meta.json')):
+        return None
+    return RecommendationEngine.load(model_dir)
 
-# Basic Steam-like color profile and page configuration
-st.set_page_config(
-    page_title="Steam Game Recommender",
-    page_icon="🎮",
-    layout="wide",
-    initial_sidebar_state="expanded",
-)
+def open_batch_results(path):
+    """Opens the batch job's precomputed recommendations, or returns None if it hasn't run."""
+    from RecommendationEngine import BatchResults
+    return BatchResults(path) if os.path.exists(path) else None
 
-# Custom CSS to mimic Steam's UI
-st.markdown("""
+# --- Streamlit App Layout ---
+STEAM_CSS = """
 <style>
     .stApp {
         background-color: #1b2838;
@@ -73,80 +50,136 @@ st.markdown("""
         color: #66c0f4;
     }
 </style>
-""", unsafe_allow_html=True)
-
-st.title("Steam Game Recommendation Engine")
+"""
+
+def main():
+    """Streamlit entry point (`streamlit run app.py`); everything with side effects starts here."""
+    import yaml
+    import streamlit as st
+    from dotenv import load_dotenv
+
+    # Load environment variables from a .env file
+    load_dotenv()
+    api_key = os.getenv("STEAM_API_KEY")
+    # Caching is applied here rather than as a decorator so importing the module doesn't need streamlit.
+    cached_get_owned_games = st.cache_data(get_owned_games)
+    with open('config.yaml', 'r', encoding='utf-8') as f:
+        settings = yaml.safe_load(f)['recommender']
+    engine = st.cache_resource(load_engine)(settings['model_dir'])
+    batch_results = st.cache_resource(open_batch_results)(settings['batch_results'])
+
+    # Basic Steam-like color profile and page configuration
+    st.set_page_config(
+        page_title="Steam Game Recommender",
+        page_icon="🎮",
+        layout="wide",
+        initial_sidebar_state="expanded",
+    )
 
-# --- API Key Check ---
-if not API_KEY:
-    st.error("Steam API Key not found.")
-    st.info(
-        "To use this app, please create a `.env` file in the project's root directory "
-        "and add your Steam API key like this:\n"
-        "STEAM_API_KEY='YOUR_API_KEY_HERE'"
+    # Custom CSS to mimic Steam's UI
+    st.markdown(STEAM_CSS, unsafe_allow_html=True)
+
+    st.title("Steam Game Recommendation Engine")
+
+    # --- API Key Check ---
+    if not api_key:
+        st.error("Steam API Key not found.")
+        st.info(
+            "To use this app, please create a `.env` file in the project's root directory "
+            "and add your Steam API key like this:\n"
+            "STEAM_API_KEY='YOUR_API_KEY_HERE'"
+        )
+        st.stop()
+
+    # --- User Input in Sidebar ---
+    st.sidebar.header("User Information")
+    steam_id = st.sidebar.text_input(
+        "Enter Your 64-bit Steam ID",
+        help="You can find your Steam ID in your profile URL or using online tools."
     )
-    st.stop()
-
-# --- User Input in Sidebar ---
-st.sidebar.header("User Information")
-steam_id = st.sidebar.text_input(
-    "Enter Your 64-bit Steam ID",
-    help="You can find your Steam ID in your profile URL or using online tools."
-)
-
-if steam_id:
-    games_df = get_owned_games(API_KEY, steam_id)
-
-    if not games_df.empty:
-        # --- Game Library and Recommendations in Main Area ---
-        col1, col2 = st.columns(2)
-
-        with col1:
-            st.header("Your Game Library")
-            st.info("Select games and adjust their playtimes to tailor your recommendations.")
-
-            search_query = st.text_input("Search your library", "", placeholder="Filter by game name...")
-
-            if search_query:
-                display_df = games_df[games_df["Game"].str.contains(search_query, case=False, na=False)]
-            else:
-                display_df = games_df
-
-            edited_df = st.data_editor(
-                display_df,
-                column_config={
-                    "Select": st.column_config.CheckboxColumn("Select", default=False),
-                    "Playtime (hours)": st.column_config.NumberColumn(
-                        "Playtime (hours)",
-                        min_value=0,
-                        format="%.1f h",
-                    )
-                },
-                disabled=["Game"],
-                hide_index=True,
-                height=600
-            )
-            selected_games = edited_df[edited_df['Select']]
-
-        with col2:
-            st.header("Your Recommendations")
-            if not selected_games.empty:
-                st.write("Based on your selection:")
-                st.dataframe(selected_games[['Game', 'Playtime (hours)']], hide_index=True)
-
-                # --- Recommendation Model Placeholder ---
-                # In a real application, the 'selected_games' DataFrame would be passed to your model.
-                st.write("### Recommended For You:")
-                recommended_games = {
-                    'Game': ['Divinity: Original Sin 2', 'Mass Effect Legendary Edition', 'Elden Ring'],
-                    'Reason': ['Similar RPG mechanics', 'Great story-driven adventure', 'Challenging open-world combat']
-                }
-                rec_df = pd.DataFrame(recommended_games)
-                st.table(rec_df)
-            else:
-                st.info("Select one or more games from your library to see recommendations.")
+
+    if steam_id:
+        # Fetch, hydrate against the catalog and build the editor table once per Steam ID, not on every rerun.
+        session_key = f"library:{steam_id}"
+        if session_key in st.session_state:
+            library, games_df = st.session_state[session_key]
+        else:
+            library = cached_get_owned_games(api_key, steam_id)
+            if engine is not None:
+                engine.hydrate(library)
+            games_df = library.to_frame()
+            if len(library):
+                st.session_state[session_key] = (library, games_df)
+
+        if not games_df.empty:
+            # --- Game Library and Recommendations in Main Area ---
+            col1, col2 = st.columns(2)
+
+            with col1:
+                st.header("Your Game Library")
+                st.info("Select games and adjust their playtimes to tailor your recommendations.")
+
+                search_query = st.text_input("Search your library", "", placeholder="Filter by game name...")
+
+                if search_query:
+                    display_df = games_df[games_df["Game"].str.contains(search_query, case=False, na=False)]
+                else:
+                    display_df = games_df
+
+                edited_df = st.data_editor(
+                    display_df,
+                    column_config={
+                        "Select": st.column_config.CheckboxColumn("Select", default=False),
+                        "Playtime (hours)": st.column_config.NumberColumn(
+                            "Playtime (hours)",
+                            min_value=0,
+                            format="%.1f h",
+                        )
+                    },
+                    disabled=["Game"],
+                    hide_index=True,
+                    height=600
+                )
+                selected_games = edited_df[edited_df['Select']]
+
+            with col2:
+                st.header("Your Recommendations")
+                if not selected_games.empty:
+                    st.write("Based on your selection:")
+                    st.dataframe(selected_games[['Game', 'Playtime (hours)']], hide_index=True)
+
+                    st.write("### Recommended For You:")
+                    if engine is None:
+                        st.info("The recommendation model hasn't been built yet. Run `python RecommendationEngine.py featurize` first.")
+                    else:
+                        profile = library.select(selected_games.index.values, selected_games['Playtime (hours)'].values)
+                        recommendations = engine.recommend(profile, top_n=10, exclude=library.app_ids)
+                        missing = int((profile.rows < 0).sum())
+                        if len(recommendations) == 0:
+                            st.info("None of the selected games are in our catalog yet, so there is nothing to recommend from.")
+                        else:
+                            st.table(recommendations.to_frame())
+                            if missing:
+                                st.caption(f"{missing} of the selected games aren't in our catalog yet and were skipped.")
+                elif engine is not None:
+                    # Without a selection, recommend for the whole library; returning users are
+                    # served the batch job's answer while their library fingerprint still matches.
+                    st.write("### Recommended For You:")
+                    st.caption("Based on your whole library. Select games to tailor the recommendations.")
+                    recommendations = engine.recommend_for_user(steam_id, library, batch_results, top_n=10)
+                    if len(recommendations) == 0:
+                        st.info("None of your games are in our catalog yet, so there is nothing to recommend from.")
+                    else:
+                        st.table(recommendations.to_frame())
+                else:
+                    st.info("Select one or more games from your library to see recommendations.")
+        else:
+            st.error("Could not retrieve your game library.")
+            st.info("Please check that your Steam ID is correct and that your 'Game Details' are set to 'Public' in your Steam profile's privacy settings.")
     else:
-        st.error("Could not retrieve your game library.")
-        st.info("Please check that your Steam ID is correct and that your 'Game Details' are set to 'Public' in your Steam profile's privacy settings.")
-else:
-    st.info("Enter your Steam ID in the sidebar to get started.")
+        st.info("Enter your Steam ID in the sidebar to get started.")
+
+
+if __name__ == "__main__":
+    # `streamlit run app.py` executes this file as __main__ on every rerun.
+    main()
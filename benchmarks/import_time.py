@@ -0,0 +1,70 @@
+"""
+Import-time benchmark for the entry-point modules.
+
+Every spawned worker process (process pools, Streamlit reruns in a fresh interpreter, batch
+jobs) pays the import cost of the modules it loads, so this measures a cold `import <module>`
+in a new interpreter, minus the bare interpreter start-up. Each import runs in an empty
+temporary directory, and any files it leaves behind are reported as side effects.
+
+    python benchmarks/import_time.py --runs 32
+"""
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODULES = {
+    'scraper': os.path.join(ROOT, 'IGDB_Scraper'),
+    'app': ROOT,
+    'RecommendationEngine': ROOT,
+}
+
+
+def time_import(code: str, runs: int):
+    """Returns per-run wall times in ms and the files each run left in its working directory."""
+    samples, leftovers = [], set()
+    for _ in range(runs):
+        workdir = tempfile.mkdtemp(prefix='import_bench_')
+        try:
+            start = time.perf_counter()
+            result = subprocess.run([sys.executable, '-c', code], cwd=workdir, capture_output=True, text=True)
+            samples.append((time.perf_counter() - start) * 1000)
+            if result.returncode != 0:
+                raise RuntimeError(result.stderr.strip().splitlines()[-1])
+            leftovers.update(os.listdir(workdir))
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+    return samples, leftovers
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='Measure cold import time of the entry-point modules.')
+    parser.add_argument('--runs', type=int, default=32, help='Fresh interpreters per module (default: 32).')
+    parser.add_argument('modules', nargs='*', default=list(MODULES), help='Modules to measure.')
+    args = parser.parse_args(argv)
+
+    baseline, _ = time_import('pass', args.runs)
+    base_ms = statistics.median(baseline)
+    print(f"interpreter start-up: {base_ms:.1f} ms (median of {args.runs})")
+    print(f"{'module':<22}{'median ms':>12}{'import ms':>12}{'p90 ms':>10}  side effects")
+    for module in args.modules:
+        code = f"import sys; sys.path.insert(0, {MODULES[module]!r}); import {module}"
+        try:
+            samples, leftovers = time_import(code, args.runs)
+        except RuntimeError as e:
+            print(f"{module:<22}{'failed':>12}  {e}")
+            continue
+        median = statistics.median(samples)
+        p90 = statistics.quantiles(samples, n=10)[-1] if len(samples) > 1 else median
+        effects = ', '.join(sorted(leftovers)) or 'none'
+        print(f"{module:<22}{median:>12.1f}{median - base_ms:>12.1f}{p90:>10.1f}  {effects}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,24 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from RecommendationEngine import FeatureStore, RecommendationEngine, _featurize_chunk
+
+
+@pytest.fixture
+def make_engine(tmp_path):
+    """Builds a small feature store from app rows, without the process pool, and loads an engine on it."""
+    def make(rows, labels=(), n_features=2 ** 12):
+        store = FeatureStore(str(tmp_path / 'model'), n_features=n_features)
+        store._append(*_featurize_chunk(rows, n_features))
+        store.reweight()
+        store.set_labels(labels)
+        return RecommendationEngine(store)
+    return make
+
+
+def app_row(app_id, name, text='roguelike deck builder card strategy', tags='1,2,3', **extra):
+    return dict(id=app_id, name=name, short_description=text, genre_ids='1', tag_ids=tags, **extra)
@@ -0,0 +1,100 @@
+import json
+
+import numpy as np
+
+from RecommendationEngine import BatchResults, Library, iter_library_snapshot, run_batch
+from conftest import app_row
+
+
+def catalog():
+    rows = [app_row(i, f"Card Game {i}") for i in range(1, 31)]
+    rows += [app_row(i, f"Farm Game {i}", text='farming life sim cozy crops', tags='5,6') for i in range(31, 61)]
+    return rows
+
+
+def owned_games(app_ids, minutes):
+    return [{'appid': int(a), 'name': f"Game {a}", 'playtime_forever': int(m)} for a, m in zip(app_ids, minutes)]
+
+
+def test_batch_results_returns_rows_only_for_the_same_fingerprint_and_model(tmp_path):
+    results = BatchResults(str(tmp_path / 'recs.sqlite'))
+    results.put_many([('76561198000000001', 'abc', 'v1', json.dumps([3, 1, 2]), json.dumps([0.9, 0.5, 0.25]))])
+
+    app_ids, scores = results.get('76561198000000001', 'abc', 'v1')
+
+    assert app_ids.tolist() == [3, 1, 2]
+    np.testing.assert_allclose(scores, [0.9, 0.5, 0.25])
+    assert results.get('76561198000000001', 'other', 'v1') is None
+    assert results.get('76561198000000001', 'abc', 'v2') is None
+    assert results.get('76561198000000002', 'abc', 'v1') is None
+
+    results.put_many([('76561198000000001', 'def', 'v1', '[7]', '[1.0]')])  # a rerun replaces the user's row
+    assert results.get('76561198000000001', 'abc', 'v1') is None
+    assert results.get('76561198000000001', 'def', 'v1')[0].tolist() == [7]
+    results.close()
+
+
+def test_library_fingerprint_ignores_order_and_small_playtime_changes():
+    library = Library.from_owned_games(owned_games([10, 20, 30], [600, 90, 0]))
+    reordered = Library.from_owned_games(owned_games([30, 10, 20], [0, 600, 90]))
+    played_a_bit = Library.from_owned_games(owned_games([10, 20, 30], [620, 100, 0]))  # same log2 buckets
+    played_more = Library.from_owned_games(owned_games([10, 20, 30], [600, 90, 240]))
+    bought_one = Library.from_owned_games(owned_games([10, 20, 30, 40], [600, 90, 0, 0]))
+
+    assert library.fingerprint() == reordered.fingerprint() == played_a_bit.fingerprint()
+    assert library.fingerprint() != played_more.fingerprint()
+    assert library.fingerprint() != bought_one.fingerprint()
+
+
+def test_run_batch_over_a_library_snapshot_matches_live_scoring(make_engine, tmp_path):
+    engine = make_engine(catalog())
+    snapshot = tmp_path / 'libraries.jsonl'
+    users = {
+        '1': owned_games([1, 2, 3], [600, 60, 0]),
+        '2': owned_games([31, 32], [1200, 30]),
+        '3': owned_games([1, 31], [30, 900]),
+        '4': owned_games([9001], [100]),  # nothing in the catalog, so not stored
+    }
+    snapshot.write_text(''.join(json.dumps({'steam_id': int(s), 'games': g}) + '\n' for s, g in users.items()),
+        encoding='utf-8')
+    output = str(tmp_path / 'recs.sqlite')
+
+    written = run_batch(engine.data.path, iter_library_snapshot(str(snapshot)), output, workers=2,
+        top_n=5, shard_size=1)
+
+    assert written == 3
+    results = BatchResults(output)
+    for steam_id in ('1', '2', '3'):
+        library = engine.hydrate(Library.from_owned_games(users[steam_id]))
+        app_ids, scores = results.get(steam_id, library.fingerprint(), engine.model_version)
+        live = engine.recommend_many([library], top_n=5, explain=False)[0]
+        assert app_ids.tolist() == live.app_ids.tolist()
+        np.testing.assert_allclose(scores, live.scores, atol=1e-5)
+    assert results.get('4', engine.hydrate(Library.from_owned_games(users['4'])).fingerprint(),
+        engine.model_version) is None
+    results.close()
+
+
+def test_recommend_for_user_serves_the_batch_answer_only_while_it_is_current(make_engine, tmp_path):
+    engine = make_engine(catalog())
+    library = engine.hydrate(Library.from_owned_games(owned_games([1, 2], [600, 60])))
+    live = engine.recommend(library, top_n=5)
+    cached = [40, 39, 38]  # deliberately unlike the live answer
+    results = BatchResults(str(tmp_path / 'recs.sqlite'))
+
+    def store(fingerprint, model_version):
+        results.put_many([('7', fingerprint, model_version, json.dumps(cached), json.dumps([0.9, 0.8, 0.7]))])
+
+    store(library.fingerprint(), engine.model_version)
+    served = engine.recommend_for_user('7', library, results, top_n=2)
+    assert served.app_ids.tolist() == cached[:2]
+    assert served.names.tolist() == ['Farm Game 40', 'Farm Game 39']
+
+    store('stale fingerprint', engine.model_version)
+    assert engine.recommend_for_user('7', library, results, top_n=5).app_ids.tolist() == live.app_ids.tolist()
+
+    store(library.fingerprint(), 'stale model')
+    assert engine.recommend_for_user('7', library, results, top_n=5).app_ids.tolist() == live.app_ids.tolist()
+
+    assert engine.recommend_for_user('7', library, None, top_n=5).app_ids.tolist() == live.app_ids.tolist()
+    results.close()
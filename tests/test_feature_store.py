@@ -0,0 +1,100 @@
+import numpy as np
+import pytest
+
+from RecommendationEngine import FeatureStore, _featurize_chunk
+from conftest import app_row
+
+
+def versioned_rows(versions, start=1):
+    return [app_row(start + i, f"App {start + i}", change_version=v) for i, v in enumerate(versions)]
+
+
+def interrupted(chunks):
+    """Yields the chunks, then fails like a dropped database connection."""
+    yield from chunks
+    raise ConnectionError("Lost connection to MySQL server during query")
+
+
+def test_interrupted_featurize_does_not_skip_the_rest_of_a_version(tmp_path):
+    store = FeatureStore(str(tmp_path / 'model'), n_features=2 ** 10)
+    rows = versioned_rows([1] * 8)  # e.g. one backfill, all at a single version
+
+    with pytest.raises(ConnectionError):
+        store.add_apps(interrupted([rows[:4]]), workers=1)
+    assert store.n_rows == 4
+    assert store.change_version == 0
+
+    store.add_apps([rows], workers=1)  # the next run re-reads everything after change_version
+    assert store.change_version == 1
+    assert sorted(store.array('app_ids')[store.array('live') == 1].tolist()) == list(range(1, 9))
+
+
+def test_versions_finished_before_an_interruption_are_kept(tmp_path):
+    store = FeatureStore(str(tmp_path / 'model'), n_features=2 ** 10)
+    rows = versioned_rows([1, 1, 1, 2, 2, 3])
+
+    with pytest.raises(ConnectionError):
+        store.add_apps(interrupted([rows[:2], rows[2:5]]), workers=1)
+
+    assert store.change_version == 1
+
+
+def live_doc_freq(store):
+    """Document frequencies recounted from the live rows only."""
+    counts = store.matrix(weighted=False)
+    return np.bincount(counts[store.array('live') == 1].indices, minlength=store.n_features)
+
+
+def test_add_apps_through_the_process_pool_matches_featurizing_in_process(tmp_path):
+    rows = [app_row(i, f"Game {i}", text=f"word{i % 7} shared words", tags=f"{i % 5},9") for i in range(1, 41)]
+    store = FeatureStore(str(tmp_path / 'model'), n_features=2 ** 10)
+
+    added = store.add_apps([rows[i:i + 6] for i in range(0, len(rows), 6)], workers=2)
+
+    app_ids, names, counts, _, _ = _featurize_chunk(rows, 2 ** 10)
+    assert added == store.n_rows == 40
+    assert store.array('app_ids').tolist() == app_ids.tolist()
+    assert store.names() == names
+    assert (store.matrix(weighted=False) != counts).nnz == 0
+    assert (store.array('doc_freq') == live_doc_freq(store)).all()
+
+
+def test_re_adding_an_app_retires_its_old_row(tmp_path):
+    store = FeatureStore(str(tmp_path / 'model'), n_features=2 ** 10)
+    store.add_apps([[app_row(1, 'Portal', text='puzzle portals', tags='1,2'), app_row(2, 'Doom', text='demons', tags='3')]],
+        workers=1)
+
+    store.add_apps([[app_row(1, 'Portal', text='puzzle portals companion cube', tags='1,4')]], workers=1)
+
+    assert store.array('app_ids').tolist() == [1, 2, 1]
+    assert store.array('live').tolist() == [0, 1, 1]
+    assert (store.array('doc_freq') == live_doc_freq(store)).all()
+    assert store.array('doc_freq').sum() == store.matrix(weighted=False)[1:].nnz
+
+
+def test_reweight_makes_live_rows_unit_norm(tmp_path):
+    store = FeatureStore(str(tmp_path / 'model'), n_features=2 ** 10)
+    store.add_apps([[app_row(i, f"Game {i}", text='cards ' * i, tags=f"{i},7") for i in range(1, 6)]], workers=1)
+    store.add_apps([[app_row(3, 'Game 3', text='racing')]], workers=1)
+
+    store.reweight(block_rows=2)
+
+    weights = store.matrix()
+    norms = np.sqrt(weights.multiply(weights).sum(axis=1)).A1
+    np.testing.assert_allclose(norms[store.array('live') == 1], 1.0, rtol=1e-5)
+    assert norms[store.array('live') == 0].tolist() == [0.0]
+
+
+def test_matrix_refuses_stale_weights(tmp_path):
+    store = FeatureStore(str(tmp_path / 'model'), n_features=2 ** 10)
+    store.add_apps([[app_row(1, 'Portal')]], workers=1)
+
+    with pytest.raises(RuntimeError):
+        store.matrix()
+    store.reweight()
+    assert store.matrix().shape == (1, 2 ** 10)
+
+    store.add_apps([[app_row(2, 'Doom')]], workers=1)
+    with pytest.raises(RuntimeError):
+        store.matrix()
+    assert store.matrix(weighted=False).shape == (2, 2 ** 10)
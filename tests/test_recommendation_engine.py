@@ -0,0 +1,118 @@
+import numpy as np
+import pytest
+
+from RecommendationEngine import FeatureStore, Library, RecommendationEngine
+from conftest import app_row
+
+
+@pytest.mark.parametrize('diversify', [True, False])
+def test_unplayed_owned_games_are_never_recommended(make_engine, diversify):
+    engine = make_engine([app_row(i, f"Card Game {i}") for i in range(1, 201)])
+    owned = np.arange(1, 120)
+    hours = np.zeros(len(owned))
+    hours[0] = 50.0  # one played game, the rest unplayed and weighted log1p(0) == 0
+    library = engine.hydrate(Library(owned, [f"Card Game {i}" for i in owned], hours))
+
+    recs = engine.recommend_many([library], top_n=10, diversify=diversify)[0]
+
+    assert len(recs) > 0
+    assert not np.isin(recs.app_ids, owned).any()
+
+
+def test_library_without_catalog_games_gets_no_recommendations(make_engine):
+    engine = make_engine([app_row(i, f"Game {i}") for i in range(1, 21)])
+    library = engine.hydrate(Library([9001, 9002], ['Unknown A', 'Unknown B'], [10.0, 2.0]))
+
+    assert len(engine.recommend(library, top_n=10)) == 0
+    assert len(engine.recommend_many([library], top_n=10, diversify=False)[0]) == 0
+
+
+def test_diversify_fills_top_n_when_one_game_has_hundreds_of_dlcs(make_engine):
+    # The base game's 200 DLCs all outscore the unrelated games, so a plain over-fetch
+    # would only ever see one family.
+    rows = [app_row(1, 'Train Sim', text='train simulator railway locomotive route', tags='7,8,9')]
+    rows += [app_row(i, f"Train Sim - Route Pack {i}", text='train simulator railway locomotive route dlc',
+        tags='7,8,9', base_game_id=1) for i in range(2, 202)]
+    rows += [app_row(i, f"Other Game {chr(65 + i % 26)}{i}", text='train puzzle strategy',
+        tags=f"7,{i % 50 + 10}") for i in range(300, 340)]
+    engine = make_engine(rows)
+    library = engine.hydrate(Library([2], ['Train Sim - Route Pack 2'], [30.0]))
+
+    plain = engine.recommend_many([library], top_n=20, diversify=False)[0]
+    diverse = engine.recommend_many([library], top_n=20)[0]
+
+    assert len(plain) == 20
+    assert len(diverse) == 20
+    families = engine.families[diverse.rows]
+    assert len(np.unique(families)) == len(families)
+    assert not np.isin(diverse.app_ids, [2]).any()
+
+
+def test_over_fetch_is_capped_and_settles_for_a_short_candidate_list(make_engine):
+    rows = [app_row(1, 'Train Sim', text='train simulator railway locomotive route', tags='7,8,9')]
+    rows += [app_row(i, f"Train Sim - Route Pack {i}", text='train simulator railway locomotive route dlc',
+        tags='7,8,9', base_game_id=1) for i in range(2, 202)]
+    rows += [app_row(i, f"Other Game {chr(65 + i % 26)}{i}", text='train puzzle strategy',
+        tags=f"7,{i % 50 + 10}") for i in range(300, 340)]
+    engine = make_engine(rows)
+    engine.MAX_OVERFETCH = 2  # only the 40 best apps, all from the Train Sim family, are looked at
+    library = engine.hydrate(Library([2], ['Train Sim - Route Pack 2'], [30.0]))
+
+    candidates = engine.diverse_candidates(engine.score([library]), 20)
+
+    assert (candidates >= 0).sum() == 1
+    assert (engine.families[candidates[candidates >= 0]] == engine.families[engine.rows_for([1])]).all()
+
+
+def test_empty_store_gets_no_candidates_or_recommendations(tmp_path):
+    store = FeatureStore(str(tmp_path / 'model'), n_features=16)
+    store.reweight()
+    engine = RecommendationEngine(store)
+    library = engine.hydrate(Library([10], ['Unknown'], [5.0]))
+    scores = engine.score([library])
+
+    assert engine.diverse_candidates(scores, 8).tolist() == [[-1] * 8]
+    assert engine.diverse_candidates(scores, 0).shape == (1, 0)
+    assert len(engine.recommend(library, top_n=5)) == 0
+
+
+def test_distinct_keeps_best_of_each_family_and_caps_franchises(make_engine):
+    rows = [app_row(1, 'Base'), app_row(2, 'Base - DLC', base_game_id=1), app_row(3, 'Saga'),
+        app_row(4, 'Saga 2'), app_row(5, 'Saga 3'), app_row(6, 'Loner')]
+    engine = make_engine(rows)
+    top = np.array([[1, 0, 2, 3, 4, 5, -1]])  # rows, best first
+
+    keep = engine._distinct(top, max_per_franchise=2)
+
+    assert keep.tolist() == [[True, False, True, True, False, True, False]]
+
+
+def test_explanations_name_the_top_contributing_game_and_shared_tags(make_engine):
+    labels = [dict(kind='tag', id=1, name='Roguelike'), dict(kind='tag', id=2, name='Deckbuilder'),
+        dict(kind='tag', id=5, name='Farming'), dict(kind='genre', id=1, name='Indie')]
+    rows = [app_row(1, 'Slay the Spire', tags='1,2'), app_row(2, 'Stardew Valley', text='farming life sim', tags='5'),
+        app_row(3, 'Monster Train', tags='1,2'), app_row(4, 'Harvest Town', text='farming life sim', tags='5')]
+    rows += [app_row(i, f"Filler {i}", text='unrelated racing cars', tags='9') for i in range(10, 40)]
+    engine = make_engine(rows, labels)
+    # Many lightly played games; explanations only look at the heaviest ones.
+    owned = [1, 2] + list(range(10, 40))
+    hours = [120.0, 0.5] + [0.1] * 30
+    library = engine.hydrate(Library(owned, ['Slay the Spire', 'Stardew Valley'] + [''] * 30, hours))
+
+    recs = engine.recommend(library, top_n=2)
+
+    reasons = dict(zip(recs.app_ids.tolist(), recs.reasons))
+    assert reasons[3].startswith('Shares tags ')
+    assert 'Roguelike' in reasons[3] and 'Deckbuilder' in reasons[3]
+    assert reasons[3].endswith('with Slay the Spire, which you played 120h')
+    assert 'Farming' in reasons[4] and 'Stardew Valley' in reasons[4]
+
+
+def test_names_with_line_separators_stay_aligned_with_their_rows(make_engine):
+    names = ['Carriage\rReturn', 'Line\u2028Separator', 'Next\x85Line', 'Form\x0cFeed', 'Plain']
+    engine = make_engine([app_row(i, name) for i, name in enumerate(names, start=1)])
+
+    assert len(engine.names) == len(names)
+    assert engine.names[engine.rows_for([5])[0]] == 'Plain'
+    assert engine.names[engine.rows_for([1])[0]] == 'Carriage Return'
+
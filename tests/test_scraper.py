@@ -0,0 +1,226 @@
+import datetime as dt
+import math
+import os
+
+import pymysql
+import pytest
+
+from IGDB_Scraper.scraper import BulkStager, DatabaseManager
+
+SCHEMA_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'schema.yaml')
+
+
+def empty_stats():
+    return DatabaseManager._review_stats_from_row(None)
+
+
+def test_add_review_to_stats_counts_weights_and_buckets():
+    stats = empty_stats()
+    DatabaseManager._add_review_to_stats(stats, 'english', dt.datetime(2024, 5, 3), True, 9, sign=1)
+    DatabaseManager._add_review_to_stats(stats, None, dt.datetime(2024, 5, 20), False, 0, sign=1)
+
+    assert stats['review_count'] == 2
+    assert stats['recommended_count'] == 1
+    assert stats['helpful_weight_total'] == pytest.approx(2.0 + math.log1p(9))
+    assert stats['helpful_weight_recommended'] == pytest.approx(1.0 + math.log1p(9))
+    assert stats['language_counts'] == {'english': 1, 'unknown': 1}
+    assert stats['monthly_histogram'] == {'2024-05': [2, 1]}
+
+
+def test_add_review_to_stats_subtracting_restores_empty_stats():
+    stats = empty_stats()
+    review = ('schinese', dt.datetime(2023, 1, 1), True, 4)
+    DatabaseManager._add_review_to_stats(stats, *review, sign=1)
+    DatabaseManager._add_review_to_stats(stats, *review, sign=-1)
+
+    assert stats['review_count'] == 0 and stats['recommended_count'] == 0
+    assert stats['helpful_weight_total'] == pytest.approx(0.0)
+    assert stats['language_counts'] == {} and stats['monthly_histogram'] == {}
+
+
+def test_add_review_to_stats_ignores_negative_votes_and_missing_date():
+    stats = empty_stats()
+    DatabaseManager._add_review_to_stats(stats, 'english', None, True, -3, sign=1)
+
+    assert stats['helpful_weight_total'] == pytest.approx(1.0)
+    assert stats['monthly_histogram'] == {}
+
+
+class FakeCursor:
+    """Answers the review_stats queries from in-memory rows and records the upserts."""
+    def __init__(self, queries, stats_row, linked_reviews):
+        self.queries, self.stats_row, self.linked_reviews = queries, stats_row, linked_reviews
+        self.saved, self.result = [], []
+
+    def execute(self, sql, params=()):
+        if sql == self.queries['select_for_update']:
+            self.result = [self.stats_row] if self.stats_row else []
+        elif sql == self.queries['select_app_reviews']:
+            self.result = list(self.linked_reviews.values())
+        elif sql == self.queries['upsert']:
+            self.saved.append(params)
+        else:  # select_existing_reviews
+            self.result = [dict(row, linked=1) for review_id, row in self.linked_reviews.items() if review_id in params[1:]]
+
+    def fetchone(self):
+        return self.result[0] if self.result else None
+
+    def fetchall(self):
+        return self.result
+
+
+def test_update_review_stats_without_a_stats_row_starts_from_linked_reviews():
+    manager = DatabaseManager.__new__(DatabaseManager)
+    manager.schema = manager._load_schema(SCHEMA_FILE)
+    linked = {i: dict(review_id=i, language='english', is_recommended=1, votes_helpful=0,
+        review_date=dt.datetime(2024, 5, i)) for i in (1, 2, 3)}
+    manager.cursor = FakeCursor(manager.schema['queries']['review_stats'], None, linked)
+    # The same three reviews are scraped again, plus one new one.
+    incoming = [(i, 'steam', 'english', 'text', True, 0, 0, dt.datetime(2024, 5, i)) for i in (1, 2, 3, 4)]
+
+    manager._update_review_stats(10, incoming)
+
+    app_id, review_count, recommended_count, *_, language_counts, histogram = manager.cursor.saved[-1]
+    assert (app_id, review_count, recommended_count) == (10, 4, 4)
+    assert language_counts == '{"english": 4}'
+    assert histogram == '{"2024-05": [4, 4]}'
+
+
+class RecordingCursor:
+    """Records every statement; lookups and the version counter all answer with fixed ids."""
+    def __init__(self):
+        self.executed = []
+
+    def execute(self, sql, params=()):
+        self.executed.append((sql, params))
+
+    def fetchone(self):
+        return {'id': 5, 'version': 7}
+
+
+def test_scraped_app_features_are_built_from_the_junction_tables_like_bulk_mode():
+    manager = DatabaseManager.__new__(DatabaseManager)
+    manager.schema, manager.bulk = manager._load_schema(SCHEMA_FILE), None
+    manager.cursor = RecordingCursor()
+    parsed = {'main_tuple': (42, 'Portal'), 'genres': ['Puzzle'], 'tags': {'Puzzle': 120}, 'supported_languages': []}
+
+    manager.add_app_and_relations(parsed)
+
+    features = manager.schema['queries']['app_features']['backfill']
+    assert manager.cursor.executed[-1] == (features.format(filter='WHERE a.id = %s'), (7, 42))
+
+
+TABLES = ['stg_apps', 'stg_reviews']
+
+
+def test_bulk_stager_keeps_rows_left_by_a_failed_merge(tmp_path):
+    stager = BulkStager(str(tmp_path), TABLES)
+    stager.write('stg_apps', (1, 'Portal\tGame', None))
+    stager.write('stg_reviews', (1, 10, 'english'))
+    stager.staged_apps += 1
+    stager.close()  # the merge failed, so the next run starts with these files on disk
+
+    resumed = BulkStager(str(tmp_path), TABLES)
+    assert (resumed.staged_apps, resumed.staged_rows) == (1, 2)
+    resumed.write('stg_apps', (2, 'Half-Life', None))
+    resumed.close()
+
+    rows = list(BulkStager.read_rows(resumed.path('stg_apps')))
+    assert rows == [('1', 'Portal\tGame', None), ('2', 'Half-Life', None)]
+
+
+def test_bulk_stager_drops_a_row_cut_off_mid_write(tmp_path):
+    (tmp_path / 'stg_apps.tsv').write_text('1\tPortal\n2\tHalf-', encoding='utf-8')
+
+    stager = BulkStager(str(tmp_path), TABLES)
+    stager.close()
+
+    assert stager.staged_rows == 1
+    assert list(BulkStager.read_rows(stager.path('stg_apps'))) == [('1', 'Portal')]
+
+
+def test_bulk_stager_starts_empty_after_a_successful_merge(tmp_path):
+    stager = BulkStager(str(tmp_path), TABLES)
+    stager.write('stg_apps', (1, 'Portal'))
+    stager.close()
+
+    stager.open()
+    stager.close()
+
+    assert stager.staged_rows == 0
+    assert list(BulkStager.read_rows(stager.path('stg_apps'))) == []
+
+
+class FakeBulkConnection:
+    """Logs statements, commits and rollbacks in one list; LOAD DATA fails with `load_error`."""
+    def __init__(self, load_sql, load_error):
+        self.load_sql, self.load_error, self.log = load_sql, load_error, []
+
+    def execute(self, sql, params=()):
+        if sql.startswith(self.load_sql):
+            raise pymysql.err.OperationalError(self.load_error, 'Loading local data is disabled')
+        self.log.append(('execute', sql))
+
+    def executemany(self, sql, rows):
+        self.log.append(('executemany', sql, rows))
+
+    def fetchone(self):
+        return {'version': 7}
+
+    def cursor(self, cursor_class=None):
+        return FakeBulkConnection.StreamingCursor()
+
+    def commit(self):
+        self.log.append(('commit', ))
+
+    def rollback(self):
+        self.log.append(('rollback', ))
+
+    class StreamingCursor:
+        def execute(self, sql):
+            pass
+
+        def __iter__(self):
+            return iter(())  # no reviews staged
+
+        def close(self):
+            pass
+
+
+@pytest.mark.parametrize('load_error', DatabaseManager.LOCAL_INFILE_DISABLED)
+def test_flush_bulk_falls_back_to_batched_inserts_and_merges_in_one_transaction(tmp_path, load_error):
+    manager = DatabaseManager.__new__(DatabaseManager)
+    manager.schema = manager._load_schema(SCHEMA_FILE)
+    staging, queries = manager.schema['staging'], manager.schema['staging']['queries']
+    manager.bulk = BulkStager(str(tmp_path), staging['create_order'])
+    manager.bulk.write('stg_apps', (1, 'Portal'))
+    manager.bulk.write('stg_apps', (2, 'Half-Life'))
+    manager.bulk.write('stg_scrape_status', (1, 'success'))
+    manager.bulk.staged_apps = 2
+    manager.connection = manager.cursor = FakeBulkConnection(queries['load'].split('{table}')[0], load_error)
+
+    manager.flush_bulk()
+
+    log = manager.connection.log
+    inserts = {entry[1]: entry[2] for entry in log if entry[0] == 'executemany'}
+    assert inserts == {
+        queries['insert'].format(table='stg_apps', placeholders='%s, %s'): [('1', 'Portal'), ('2', 'Half-Life')],
+        queries['insert'].format(table='stg_scrape_status', placeholders='%s, %s'): [('1', 'success')],
+    }
+
+    statements = [entry[1] for entry in log if entry[0] == 'execute']
+    truncates = [queries['truncate'].format(table=t) for t in staging['create_order']]
+    utility, features = manager.schema['queries']['utility_queries'], manager.schema['queries']['app_features']
+    merges = [queries['merge_apps'], queries['merge_pending_dlc_links'],
+        utility['resolve_dlc_links'], utility['clear_resolved_dlc_links']]
+    merges += [queries['merge_lookup'].format(table=t)
+        for t in ['developers', 'publishers', 'categories', 'genres', 'languages', 'tags']]
+    merges += [queries['merge_junction'].format(table=t) for t in ['developers', 'publishers', 'categories', 'genres']]
+    merges += [queries['merge_languages'], queries['merge_tags'], features['next_version'], features['current_version'],
+        features['backfill'].format(filter='WHERE a.id IN (SELECT id FROM stg_apps)'), queries['merge_achievements'],
+        queries['merge_reviews'], queries['merge_app_reviews'], queries['merge_scrape_status']]
+    assert statements == truncates + merges
+
+    # TRUNCATE commits implicitly; after it, everything up to the single commit is one transaction.
+    assert [entry for entry in log if entry[0] in ('commit', 'rollback')] == [('commit', )]
+    assert log[-1] == ('commit', )